@@ -11,7 +11,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 # this is a comment
 from pathlib import Path
-from decouple import config
+from decouple import Csv, config
 from celery.schedules import crontab
 import os
 import base64
@@ -69,6 +69,7 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "main_app.middleware.DecryptionCacheMiddleware",
 ]
 ROOT_URLCONF = 'DearMe.urls'
 
@@ -159,17 +160,123 @@ DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
 
 BREVO_API_KEY = config("BREVO_API_KEY")
 BREVO_SENDER_EMAIL = config("BREVO_SENDER_EMAIL")
+# Point at `manage.py run_fake_brevo` (e.g. http://127.0.0.1:8025/v3) for load tests
+BREVO_API_HOST = config("BREVO_API_HOST", default="https://api.brevo.com/v3")
+# Connect and read timeout for each Brevo call. Keep it well below
+# LETTER_DELIVERY_LEASE_SECONDS: a call still waiting when its lease runs out
+# lets another worker claim and send the same message.
+BREVO_REQUEST_TIMEOUT_SECONDS = config("BREVO_REQUEST_TIMEOUT_SECONDS", default=20, cast=float)
 
 CRISPY_ALLOWED_TEMPLATE_PACKS = "bootstrap5"
 CRISPY_TEMPLATE_PACK = "bootstrap5"
 MEDIA_URL = '/media/'
 MEDIA_ROOT = str(BASE_DIR / 'media')
 EMAIL_HOST_USER = config("EMAIL_HOST_USER")
-FIELD_ENCRYPTION_KEY = config("FIELD_ENCRYPTION_KEY")
+# Comma-separated: the first key encrypts, any of them decrypts. To rotate,
+# set "new,old", run `manage.py rotate_encryption_key`, then drop "old".
+FIELD_ENCRYPTION_KEY = config("FIELD_ENCRYPTION_KEY", cast=Csv())
+# Key for the diary search blind index; derived from FIELD_ENCRYPTION_KEY
+# when empty (run `manage.py reindex_diaries` after changing either)
+DIARY_SEARCH_KEY = config("DIARY_SEARCH_KEY", default="")
+# Opt-in cache of decrypted diary fields: "off", "request" (per request,
+# zeroed afterwards) or "ttl" (per process, entries expire)
+FIELD_DECRYPTION_CACHE = config("FIELD_DECRYPTION_CACHE", default="off")
+FIELD_DECRYPTION_CACHE_MAX_BYTES = config("FIELD_DECRYPTION_CACHE_MAX_BYTES", default=4 * 1024 * 1024, cast=int)
+FIELD_DECRYPTION_CACHE_TTL_SECONDS = config("FIELD_DECRYPTION_CACHE_TTL_SECONDS", default=300, cast=int)
 
 # CRONJOBS = [
 #     ('0 */6 * * *', 'django.core.management.call_command', ['send_due_letters']),
 # ]
-CRONJOBS = [
-    ('*/2 * * * *', 'django.core.management.call_command', ['send_due_letters']),
-]
+# Letters are delivered by the run_delivery_daemon worker (see Procfile);
+# send_due_letters is still available for one-off runs.
+# CRONJOBS = [
+#     ('*/2 * * * *', 'django.core.management.call_command', ['send_due_letters']),
+# ]
+CRONJOBS = []
+
+# Memory, diary and letter lists: rows per page / infinite-scroll batch
+LIST_PAGE_SIZE = config("LIST_PAGE_SIZE", default=24, cast=int)
+# Memory full-text search: ranked results shown
+SEARCH_RESULTS_LIMIT = config("SEARCH_RESULTS_LIMIT", default=50, cast=int)
+
+# Photo uploads (main_app.uploads): larger images are rejected from their
+# header; the rest are stored downscaled to IMAGE_MAX_EDGE without metadata
+IMAGE_MAX_PIXELS = config("IMAGE_MAX_PIXELS", default=64_000_000, cast=int)
+IMAGE_MAX_EDGE = config("IMAGE_MAX_EDGE", default=2560, cast=int)
+IMAGE_UPLOAD_QUALITY = config("IMAGE_UPLOAD_QUALITY", default=85, cast=int)
+
+# Content-addressed uploads (main_app.storage): hours an unreferenced file is
+# kept before prune_media_blobs deletes it
+MEDIA_BLOB_GRACE_HOURS = config("MEDIA_BLOB_GRACE_HOURS", default=24, cast=int)
+
+# Photo variants (main_app.thumbnails): widths for srcset, encoder quality,
+# worker processes resizing after upload (0 = resize inline)
+IMAGE_VARIANT_WIDTHS = config("IMAGE_VARIANT_WIDTHS", default="320,640,1280", cast=Csv(int))
+IMAGE_VARIANT_QUALITY = config("IMAGE_VARIANT_QUALITY", default=80, cast=int)
+IMAGE_VARIANT_WORKERS = config("IMAGE_VARIANT_WORKERS", default=2, cast=int)
+
+# Tag/location autocomplete: in-process prefix index
+AUTOCOMPLETE_REFRESH_SECONDS = config("AUTOCOMPLETE_REFRESH_SECONDS", default=60, cast=int)
+AUTOCOMPLETE_REBUILD_SECONDS = config("AUTOCOMPLETE_REBUILD_SECONDS", default=60 * 60, cast=int)
+AUTOCOMPLETE_CANDIDATES = config("AUTOCOMPLETE_CANDIDATES", default=200, cast=int)
+
+# "I'm sad" button: how many recent picks not to repeat, and an optional
+# bias: "" (uniform), "older" or "less_viewed"
+HAPPY_MEMORY_NO_REPEAT = config("HAPPY_MEMORY_NO_REPEAT", default=5, cast=int)
+HAPPY_MEMORY_WEIGHTING = config("HAPPY_MEMORY_WEIGHTING", default="")
+
+# Letter delivery
+LETTER_DELIVERY_CONCURRENCY = config("LETTER_DELIVERY_CONCURRENCY", default=8, cast=int)
+LETTER_DELIVERY_BATCH_SIZE = config("LETTER_DELIVERY_BATCH_SIZE", default=200, cast=int)
+LETTER_RECIPIENT_BATCH_SIZE = config("LETTER_RECIPIENT_BATCH_SIZE", default=50, cast=int)
+LETTER_DELIVERY_LEASE_SECONDS = config("LETTER_DELIVERY_LEASE_SECONDS", default=300, cast=int)
+DELIVERY_DAEMON_POLL_SECONDS = config("DELIVERY_DAEMON_POLL_SECONDS", default=5, cast=int)
+# Longest wait between passes while a scheduler pass keeps failing
+DELIVERY_DAEMON_MAX_BACKOFF_SECONDS = config("DELIVERY_DAEMON_MAX_BACKOFF_SECONDS", default=300, cast=int)
+DELIVERY_DAEMON_HORIZON_SECONDS = config("DELIVERY_DAEMON_HORIZON_SECONDS", default=60 * 60, cast=int)
+
+# Bulk lifecycle transitions (lock after the grace window, archive old
+# letters), run by the delivery daemon and `manage.py letter_lifecycle`
+LETTER_LIFECYCLE_INTERVAL_SECONDS = config("LETTER_LIFECYCLE_INTERVAL_SECONDS", default=5 * 60, cast=int)
+LETTER_LIFECYCLE_BATCH_SIZE = config("LETTER_LIFECYCLE_BATCH_SIZE", default=1_000, cast=int)
+LETTER_ARCHIVE_AFTER_DAYS = config("LETTER_ARCHIVE_AFTER_DAYS", default=365, cast=int)
+
+# Background mail dispatch: "celery" when a broker is configured, otherwise an
+# in-process thread pool (single-node installs)
+CELERY_BROKER_URL = config("CELERY_BROKER_URL", default="")
+CELERY_TASK_IGNORE_RESULT = True
+MAIL_DISPATCH_BACKEND = config("MAIL_DISPATCH_BACKEND", default="celery" if CELERY_BROKER_URL else "thread")
+MAIL_DISPATCH_THREADS = config("MAIL_DISPATCH_THREADS", default=4, cast=int)
+
+# Letter attachments: larger files are sent as a signed download link
+LETTER_ATTACHMENT_INLINE_MAX_BYTES = config("LETTER_ATTACHMENT_INLINE_MAX_BYTES", default=5 * 1024 * 1024, cast=int)
+ATTACHMENT_CACHE_DIR = config("ATTACHMENT_CACHE_DIR", default=str(BASE_DIR / ".cache" / "attachments"))
+# Base64 copies unused this long are deleted by prune_media_blobs
+ATTACHMENT_CACHE_MAX_AGE_HOURS = config("ATTACHMENT_CACHE_MAX_AGE_HOURS", default=7 * 24, cast=int)
+LETTER_DIARY_EXCERPT_CHARS = config("LETTER_DIARY_EXCERPT_CHARS", default=500, cast=int)
+# Absolute base URL used for links inside emails
+SITE_URL = config("SITE_URL", default="http://127.0.0.1:8000")
+
+# Delivery metrics (/metrics/ and `manage.py delivery_metrics`)
+METRICS_TOKEN = config("METRICS_TOKEN", default="")
+METRICS_WINDOW_SECONDS = config("METRICS_WINDOW_SECONDS", default=60 * 60, cast=int)
+METRICS_RETENTION_DAYS = config("METRICS_RETENTION_DAYS", default=14, cast=int)
+
+# Outbox retries
+OUTBOX_MAX_ATTEMPTS = config("OUTBOX_MAX_ATTEMPTS", default=8, cast=int)
+OUTBOX_BACKOFF_BASE_SECONDS = config("OUTBOX_BACKOFF_BASE_SECONDS", default=60, cast=int)
+OUTBOX_BACKOFF_MAX_SECONDS = config("OUTBOX_BACKOFF_MAX_SECONDS", default=6 * 60 * 60, cast=int)
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "formatters": {
+        "kv": {"format": "%(asctime)s level=%(levelname)s logger=%(name)s %(message)s"},
+    },
+    "handlers": {
+        "console": {"class": "logging.StreamHandler", "formatter": "kv"},
+    },
+    "loggers": {
+        "main_app": {"handlers": ["console"], "level": config("LOG_LEVEL", default="INFO")},
+    },
+}
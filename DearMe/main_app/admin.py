@@ -1,6 +1,8 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import CustomUser, Tag, Location, Memory, DailyDiary, Letter
+from .memory_search import rank_memories
+from .search import matching_diaries
+from .models import CustomUser, Tag, Location, Memory, DailyDiary, Letter, LetterRecipient, OutboundEmail
 
 
 # ----------------------------
@@ -52,9 +54,16 @@ class LocationAdmin(admin.ModelAdmin):
 class MemoryAdmin(admin.ModelAdmin):
     list_display = ('title', 'owner', 'memory_type', 'memory_date', 'is_private', 'take_to_grave')
     list_filter = ('memory_type', 'is_private', 'take_to_grave', 'created_at')
-    search_fields = ('title', 'description', 'owner__username')
+    # title/description go through the full-text index instead of LIKE scans
+    search_fields = ('owner__username',)
     date_hierarchy = 'memory_date'
 
+    def get_search_results(self, request, queryset, search_term):
+        results, may_have_duplicates = super().get_search_results(request, queryset, search_term)
+        if search_term:
+            results |= queryset.filter(pk__in=rank_memories(search_term, limit=500))
+        return results, may_have_duplicates
+
 
 # ----------------------------
 # DailyDiary Admin
@@ -63,16 +72,42 @@ class MemoryAdmin(admin.ModelAdmin):
 class DailyDiaryAdmin(admin.ModelAdmin):
     list_display = ('owner', 'entry_date', 'take_to_grave', 'created_at')
     list_filter = ('take_to_grave', 'created_at')
-    search_fields = ('owner__username', 'text')
+    # text is encrypted, so it is searched through the blind index instead
+    search_fields = ('owner__username',)
     date_hierarchy = 'entry_date'
 
+    def get_search_results(self, request, queryset, search_term):
+        results, may_have_duplicates = super().get_search_results(request, queryset, search_term)
+        if search_term:
+            results |= matching_diaries(queryset, search_term)
+        return results, may_have_duplicates
+
 
 # ----------------------------
 # Letter Admin
 # ----------------------------
+class LetterRecipientInline(admin.TabularInline):
+    model = LetterRecipient
+    extra = 0
+    fields = ('email', 'user', 'status', 'provider_message_id', 'sent_at', 'last_error')
+    readonly_fields = fields
+
+
 @admin.register(Letter)
 class LetterAdmin(admin.ModelAdmin):
+    inlines = [LetterRecipientInline]
     list_display = ('subject', 'sender', 'status', 'delivery_date', 'created_at')
     list_filter = ('status', 'delivery_date', 'created_at')
     search_fields = ('subject', 'body', 'sender__username', 'external_emails')
     date_hierarchy = 'delivery_date'
+
+
+# ----------------------------
+# Outbound Email Admin
+# ----------------------------
+@admin.register(OutboundEmail)
+class OutboundEmailAdmin(admin.ModelAdmin):
+    list_display = ('idempotency_key', 'kind', 'status', 'attempts', 'next_attempt_at', 'sent_at')
+    list_filter = ('kind', 'status')
+    search_fields = ('idempotency_key', 'subject', 'provider_message_id')
+    readonly_fields = ('created_at',)
@@ -4,3 +4,13 @@ from django.apps import AppConfig
 class MainAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'main_app'
+
+    def ready(self):
+        from django.conf import settings
+        from PIL import Image
+
+        from . import signals  # noqa: F401
+
+        # Pillow's own bomb guard (warns above, raises at twice this) for
+        # every decode, including admin uploads and the resize workers
+        Image.MAX_IMAGE_PIXELS = settings.IMAGE_MAX_PIXELS
@@ -0,0 +1,96 @@
+import base64
+import hashlib
+import os
+import tempfile
+import time
+from functools import lru_cache
+
+from django.conf import settings
+
+
+# ----------------------------
+# Cached base64 attachments
+# ----------------------------
+# Multiple of 3 bytes, so each chunk encodes to base64 without padding and the
+# encoded chunks can simply be concatenated.
+CHUNK_SIZE = 3 * 256 * 1024
+
+
+@lru_cache(maxsize=1024)
+def _digest(path, size, mtime):
+    # Keyed on size and mtime too, so a replaced file is hashed again
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def file_digest(path):
+    stat = os.stat(path)
+    return _digest(path, stat.st_size, stat.st_mtime_ns)
+
+
+def encoded_path(path):
+    # Encoded artifacts are keyed by content hash: retries and other letters
+    # carrying the same bytes reuse the file instead of encoding again.
+    cache_dir = settings.ATTACHMENT_CACHE_DIR
+    target = os.path.join(cache_dir, f"{file_digest(path)}.b64")
+    if os.path.exists(target):
+        os.utime(target)  # still in use; see prune_encoded()
+        return target
+
+    os.makedirs(cache_dir, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as out, open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                out.write(base64.b64encode(chunk))
+        # Atomic, so concurrent workers never read a half-written artifact
+        os.replace(tmp, target)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return target
+
+
+def discard_encoded(digest):
+    # The blob with this content hash is gone (storage.prune_blobs)
+    try:
+        os.unlink(os.path.join(settings.ATTACHMENT_CACHE_DIR, f"{digest}.b64"))
+    except FileNotFoundError:
+        pass
+
+
+def prune_encoded(dry_run=False):
+    # Deletes copies unused for ATTACHMENT_CACHE_MAX_AGE_HOURS, which also
+    # covers attachments stored before content addressing and temp files
+    # left by a crashed worker. Returns (files removed, bytes freed).
+    cutoff = time.time() - settings.ATTACHMENT_CACHE_MAX_AGE_HOURS * 3600
+    removed = freed = 0
+    try:
+        entries = list(os.scandir(settings.ATTACHMENT_CACHE_DIR))
+    except FileNotFoundError:
+        return removed, freed
+    for entry in entries:
+        try:
+            stat = entry.stat()
+            if not entry.is_file() or stat.st_mtime >= cutoff:
+                continue
+            if not dry_run:
+                os.unlink(entry.path)
+        except FileNotFoundError:
+            continue  # removed by another prune
+        removed, freed = removed + 1, freed + stat.st_size
+    return removed, freed
+
+
+def should_inline(field_file):
+    return field_file.size <= settings.LETTER_ATTACHMENT_INLINE_MAX_BYTES
+
+
+def inline_attachment(field_file):
+    with open(encoded_path(field_file.path)) as f:
+        content = f.read()
+    name = getattr(field_file.instance, "attachment_filename", None) or os.path.basename(field_file.name)
+    return [{"content": content, "name": name}]
@@ -0,0 +1,131 @@
+import bisect
+import threading
+import time
+
+from django.conf import settings
+from django.db.models import Count, Max
+
+
+# ----------------------------
+# Tag / location autocomplete
+# ----------------------------
+class PrefixIndex:
+    # Sorted array of (casefolded name, pk, name) held in process memory. A
+    # prefix lookup is two binary searches. New rows are picked up every
+    # AUTOCOMPLETE_REFRESH_SECONDS by loading pk > the highest pk seen (and
+    # immediately in this process through signals); renames and deletes made
+    # by other processes show up at the next full rebuild.
+
+    def __init__(self, queryset_factory):
+        self.queryset_factory = queryset_factory
+        self.entries = []
+        self.by_pk = {}
+        self.max_pk = 0
+        self.refreshed_at = self.rebuilt_at = 0
+        self._lock = threading.Lock()
+
+    def _load(self, queryset):
+        return [(name.casefold(), pk, name) for pk, name in queryset.values_list("pk", "name")]
+
+    def _refresh(self):
+        now = time.monotonic()
+        if now - self.rebuilt_at >= settings.AUTOCOMPLETE_REBUILD_SECONDS:
+            queryset = self.queryset_factory()
+            entries = sorted(self._load(queryset))
+            with self._lock:
+                self.entries = entries
+                self.by_pk = {entry[1]: entry for entry in entries}
+                self.max_pk = queryset.aggregate(top=Max("pk"))["top"] or 0
+                self.rebuilt_at = self.refreshed_at = now
+        elif now - self.refreshed_at >= settings.AUTOCOMPLETE_REFRESH_SECONDS:
+            for entry in self._load(self.queryset_factory().filter(pk__gt=self.max_pk)):
+                self.add(entry[1], entry[2])
+            self.refreshed_at = now
+
+    def add(self, pk, name):
+        # Also handles renames: the old entry for pk is dropped first
+        self.remove(pk)
+        with self._lock:
+            entry = (name.casefold(), pk, name)
+            bisect.insort(self.entries, entry)
+            self.by_pk[pk] = entry
+            self.max_pk = max(self.max_pk, pk)
+
+    def remove(self, pk):
+        with self._lock:
+            entry = self.by_pk.pop(pk, None)
+            if entry is not None:
+                index = bisect.bisect_left(self.entries, entry)
+                if index < len(self.entries) and self.entries[index] == entry:
+                    del self.entries[index]
+
+    def lookup(self, prefix, limit):
+        self._refresh()
+        key = prefix.casefold()
+        entries = self.entries
+        start = bisect.bisect_left(entries, (key,))
+        end = bisect.bisect_left(entries, (key + "\U0010ffff",), lo=start)
+        return entries[start:min(end, start + limit)]
+
+
+def _tags():
+    from .models import Tag
+    return Tag.objects.all()
+
+
+def _locations():
+    from .models import Location
+    return Location.objects.all()
+
+
+tag_index = PrefixIndex(_tags)
+location_index = PrefixIndex(_locations)
+
+
+# Per-user usage counts, cached briefly so keystrokes don't query them
+_usage_cache = {}
+_usage_lock = threading.Lock()
+
+
+def _usage(kind, user):
+    from .models import DailyDiary, Memory
+
+    key = (kind, user.pk)
+    cached = _usage_cache.get(key)
+    if cached and time.monotonic() - cached[0] < settings.AUTOCOMPLETE_REFRESH_SECONDS:
+        return cached[1]
+
+    if kind == "tag":
+        rows = Memory.tags.through.objects.filter(memory__owner=user).values_list("tag_id").annotate(n=Count("pk"))
+        counts = dict(rows.order_by())
+    else:
+        counts = dict(
+            Memory.objects.filter(owner=user, location__isnull=False)
+            .values_list("location_id").annotate(n=Count("pk")).order_by()
+        )
+        diary_rows = DailyDiary.locations.through.objects.filter(dailydiary__owner=user)
+        for location_id, n in diary_rows.values_list("location_id").annotate(n=Count("pk")).order_by():
+            counts[location_id] = counts.get(location_id, 0) + n
+
+    with _usage_lock:
+        if len(_usage_cache) > 10_000:
+            _usage_cache.clear()
+        _usage_cache[key] = (time.monotonic(), counts)
+    return counts
+
+
+def suggest(kind, user, prefix, limit=10):
+    # Prefix matches, the user's most used first, then alphabetical
+    if not prefix:
+        return []
+    index = tag_index if kind == "tag" else location_index
+    candidates = set(index.lookup(prefix, settings.AUTOCOMPLETE_CANDIDATES))
+    usage = _usage(kind, user)
+    # The user's own names always compete, even past the first candidates
+    key = prefix.casefold()
+    for pk in usage:
+        entry = index.by_pk.get(pk)
+        if entry and entry[0].startswith(key):
+            candidates.add(entry)
+    ranked = sorted(candidates, key=lambda entry: (-usage.get(entry[1], 0), entry[0]))
+    return [name for _, _, name in ranked[:limit]]
@@ -0,0 +1,144 @@
+import os
+import socket
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .mail import get_brevo_api
+from .models import Letter, OutboundEmail
+from .outbox import attempt, enqueue_letters, lease_free, prepare_message, record_results
+
+
+# ----------------------------
+# Batched letter delivery
+# ----------------------------
+@dataclass
+class DeliveryReport:
+    sent: list = field(default_factory=list)
+    failed: list = field(default_factory=list)
+    latencies: list = field(default_factory=list)
+    enqueued: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def total(self):
+        return len(self.sent) + len(self.failed)
+
+    @property
+    def rate(self):
+        return self.total / self.elapsed if self.elapsed else 0.0
+
+
+def due_letters(now=None):
+    return Letter.objects.filter(status__in=Letter.DELIVERABLE_STATUSES, delivery_date__lte=now or timezone.now())
+
+
+def due_emails(now=None):
+    return OutboundEmail.objects.filter(status="pending", next_attempt_at__lte=now or timezone.now())
+
+
+def make_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+# ----------------------------
+# Claiming (leases)
+# ----------------------------
+def claim(queryset, worker_id, limit, lease_seconds=None, now=None, order_by="pk"):
+    now = now or timezone.now()
+    lease_seconds = lease_seconds or settings.LETTER_DELIVERY_LEASE_SECONDS
+    expires = now + timedelta(seconds=lease_seconds)
+    model = queryset.model
+
+    # Unclaimed rows, plus rows whose previous worker died or gave up
+    claimable = queryset.filter(lease_free(now))
+    candidates = claimable.order_by(order_by)
+
+    if connection.features.has_select_for_update_skip_locked:
+        # Postgres: rows locked by another worker are skipped, not waited on
+        with transaction.atomic():
+            ids = list(candidates.select_for_update(skip_locked=True).values_list("pk", flat=True)[:limit])
+            model.objects.filter(pk__in=ids).update(claimed_by=worker_id, lease_expires_at=expires)
+    else:
+        # SQLite has no row locks; a single conditional UPDATE is atomic there,
+        # so two workers can never both match the same unleased row.
+        claimable.filter(pk__in=candidates.values("pk")[:limit]).update(
+            claimed_by=worker_id, lease_expires_at=expires
+        )
+
+    return model.objects.filter(claimed_by=worker_id, lease_expires_at=expires).order_by("pk")
+
+
+def enqueue_due_letters(worker_id, batch_size, now=None):
+    # Moves due letters into the outbox; the outbox owns retries from here on
+    enqueued = 0
+    while True:
+        batch = list(claim(due_letters(now), worker_id, batch_size, order_by="delivery_date").prefetch_related("receivers"))
+        if not batch:
+            return enqueued
+
+        emails = enqueue_letters(batch)
+        queued = [letter.pk for letter in batch if letter.pk in emails]
+        empty = [letter.pk for letter in batch if letter.pk not in emails]
+        enqueued += len(queued)
+
+        Letter.objects.filter(pk__in=queued).update(
+            status="sending", claimed_by="", lease_expires_at=None, updated_at=timezone.now()
+        )
+        Letter.objects.filter(pk__in=empty).update(
+            status="failed", claimed_by="", lease_expires_at=None, updated_at=timezone.now()
+        )
+
+
+def dispatch_outbox(worker_id, concurrency, batch_size, report, on_result=None):
+    api_instance = get_brevo_api()
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        while True:
+            # Failed messages get a future next_attempt_at, so they are not
+            # claimed again within the same run.
+            batch = list(claim(due_emails(), worker_id, batch_size, order_by="next_attempt_at").select_related("letter"))
+            if not batch:
+                break
+
+            jobs = []
+            for email in batch:
+                message, error = prepare_message(email)
+                jobs.append((email, error if message is None else pool.submit(attempt, api_instance, message)))
+            results = []
+            for email, job in jobs:
+                if isinstance(job, Exception):
+                    message_ids, error, latency = None, job, 0.0
+                else:
+                    try:
+                        message_ids, error, latency = job.result()
+                    except Exception as e:
+                        # Unexpected client error: record it rather than lose the batch's leases
+                        message_ids, error, latency = None, e, 0.0
+                results.append((email, message_ids, error, latency))
+                report.latencies.append(latency)
+                (report.sent if error is None else report.failed).append(email.pk)
+                if on_result:
+                    on_result(email, error)
+
+            record_results(results)
+
+
+def deliver_due_letters(concurrency=None, batch_size=None, on_result=None, worker_id=None):
+    concurrency = concurrency or settings.LETTER_DELIVERY_CONCURRENCY
+    batch_size = batch_size or settings.LETTER_DELIVERY_BATCH_SIZE
+    worker_id = worker_id or make_worker_id()
+    report = DeliveryReport()
+    started = time.monotonic()
+
+    report.enqueued = enqueue_due_letters(worker_id, batch_size)
+    dispatch_outbox(worker_id, concurrency, batch_size, report, on_result=on_result)
+
+    report.elapsed = time.monotonic() - started
+    return report
@@ -0,0 +1,104 @@
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# ----------------------------
+# Local stand-in for Brevo's transactional email API
+# ----------------------------
+class FakeBrevoHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length)
+        server = self.server
+
+        if not self.path.endswith("/smtp/email"):
+            return self.respond(404, {"code": "not_found", "message": "Unknown endpoint"})
+
+        if server.latency:
+            # Exponential-ish tail like a real provider: mostly near the mean
+            time.sleep(random.expovariate(1 / server.latency))
+
+        if not server.take_token():
+            server.count("rate_limited")
+            return self.respond(429, {"code": "too_many_requests", "message": "Rate limit exceeded"},
+                                headers={"Retry-After": "1"})
+        if random.random() < server.error_rate:
+            server.count("errors")
+            return self.respond(500, {"code": "internal_error", "message": "Simulated failure"})
+
+        try:
+            payload = json.loads(body or b"{}")
+        except ValueError:
+            return self.respond(400, {"code": "bad_request", "message": "Invalid JSON"})
+        versions = payload.get("messageVersions")
+        if not payload.get("to") and not versions:
+            return self.respond(400, {"code": "missing_parameter", "message": "to is missing"})
+        addresses = list(payload.get("to") or [])
+        for version in versions or []:
+            addresses += version.get("to") or []
+        if any("@" not in to.get("email", "") for to in addresses):
+            return self.respond(400, {"code": "invalid_parameter", "message": "email is not valid in to"})
+
+        server.count("accepted")
+        if versions:
+            return self.respond(201, {"messageIds": [f"<{uuid.uuid4()}@fake.brevo>" for _ in versions]})
+        return self.respond(201, {"messageId": f"<{uuid.uuid4()}@fake.brevo>"})
+
+    def respond(self, status, payload, headers=None):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeBrevoServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address=("127.0.0.1", 0), latency=0.0, error_rate=0.0, rate_limit=0):
+        super().__init__(address, FakeBrevoHandler)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit  # requests per second, 0 = unlimited
+        self.stats = {"accepted": 0, "errors": 0, "rate_limited": 0}
+        self._lock = threading.Lock()
+        self._tokens = float(rate_limit)
+        self._refilled_at = time.monotonic()
+
+    @property
+    def host(self):
+        return f"http://{self.server_address[0]}:{self.server_address[1]}/v3"
+
+    def count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def take_token(self):
+        # Token bucket refilled at rate_limit per second
+        if not self.rate_limit:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.rate_limit, self._tokens + (now - self._refilled_at) * self.rate_limit)
+            self._refilled_at = now
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return thread
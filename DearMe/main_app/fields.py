@@ -0,0 +1,130 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+
+import cryptography.fernet
+from django.conf import settings
+from encrypted_model_fields.fields import EncryptedTextField, decrypt_str
+
+
+# ----------------------------
+# Decryption cache
+# ----------------------------
+class DecryptionCache:
+    # LRU of ciphertext digest -> UTF-8 plaintext, capped by total plaintext
+    # bytes. The same ciphertext always decrypts to the same plaintext, so a
+    # hit is always correct. Buffers are overwritten with zeros when evicted
+    # or expired. (The str handed back to the caller is ordinary Python
+    # memory and can't be scrubbed; this bounds how long the cache itself
+    # holds plaintext.)
+
+    def __init__(self, max_bytes, ttl=None):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # digest -> (bytearray, expires_at)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def digest(ciphertext):
+        return hashlib.blake2b(ciphertext.encode("utf-8"), digest_size=20).digest()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            buffer, expires_at = entry
+            if expires_at is not None and time.monotonic() >= expires_at:
+                self._evict(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return buffer.decode("utf-8")
+
+    def put(self, key, plaintext):
+        buffer = bytearray(plaintext.encode("utf-8"))
+        if len(buffer) > self.max_bytes:
+            return
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            if key in self._entries:
+                self._evict(key)
+            self._entries[key] = (buffer, expires_at)
+            self.size += len(buffer)
+            while self.size > self.max_bytes:
+                self._evict(next(iter(self._entries)))
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._entries):
+                self._evict(key)
+
+    def _evict(self, key):
+        buffer, _ = self._entries.pop(key)
+        self.size -= len(buffer)
+        buffer[:] = bytes(len(buffer))
+
+
+_process_cache = None
+_process_cache_lock = threading.Lock()
+_request_cache = ContextVar("decryption_cache", default=None)
+
+
+def get_decryption_cache():
+    # FIELD_DECRYPTION_CACHE: "off", "request" (one cache per request, zeroed
+    # when the response is done, see DecryptionCacheMiddleware) or "ttl" (one
+    # per process, entries expire after FIELD_DECRYPTION_CACHE_TTL_SECONDS).
+    global _process_cache
+    mode = settings.FIELD_DECRYPTION_CACHE
+    if mode == "request":
+        return _request_cache.get()
+    if mode == "ttl":
+        if _process_cache is None:
+            with _process_cache_lock:
+                if _process_cache is None:
+                    _process_cache = DecryptionCache(
+                        settings.FIELD_DECRYPTION_CACHE_MAX_BYTES, ttl=settings.FIELD_DECRYPTION_CACHE_TTL_SECONDS
+                    )
+        return _process_cache
+    return None
+
+
+def start_request_cache():
+    return _request_cache.set(DecryptionCache(settings.FIELD_DECRYPTION_CACHE_MAX_BYTES))
+
+
+def end_request_cache(token):
+    cache = _request_cache.get()
+    _request_cache.reset(token)
+    if cache is not None:
+        cache.clear()
+
+
+class CachedEncryptedTextField(EncryptedTextField):
+    # EncryptedTextField that consults the decryption cache before running
+    # Fernet. Behaves exactly like the parent when the cache is off.
+
+    def to_python(self, value):
+        if isinstance(value, bytes):
+            value = value.decode("utf-8")
+        cache = get_decryption_cache() if isinstance(value, str) else None
+        if cache is None:
+            return super().to_python(value)
+
+        key = cache.digest(value)
+        plaintext = cache.get(key)
+        if plaintext is None:
+            try:
+                plaintext = decrypt_str(value)
+            except cryptography.fernet.InvalidToken:
+                # Already plaintext (form input, legacy rows): nothing to cache
+                return super().to_python(value)
+            cache.put(key, plaintext)
+        return plaintext
@@ -1,7 +1,38 @@
 from django import forms
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
 from django.contrib.auth import authenticate
-from .models import Letter, CustomUser, Memory, DailyDiary, Tag, Location
+from django.urls import reverse_lazy
+from .models import Letter, CustomUser, Memory, DailyDiary
+from .naming import resolve_locations, resolve_tags
+from .uploads import NormalizedImageField
+
+
+# -----------------------
+# Search picker widget
+# -----------------------
+class SearchPickerWidget(forms.SelectMultiple):
+    # Renders only the currently selected options; everything else is fetched
+    # from search_url as the user types, so the page never lists a whole table.
+    class Media:
+        js = ["js/letters/search_picker.js"]
+
+    def __init__(self, search_url, attrs=None):
+        super().__init__(attrs={"class": "search-picker", **(attrs or {})})
+        self.search_url = search_url
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        context["widget"]["attrs"]["data-search-url"] = str(self.search_url)
+        return context
+
+    def optgroups(self, name, value, attrs=None):
+        iterator = self.choices
+        ids = [v for v in value if str(v).isdigit()]
+        self.choices = [iterator.choice(obj) for obj in iterator.queryset.filter(pk__in=ids)] if ids else []
+        try:
+            return super().optgroups(name, value, attrs)
+        finally:
+            self.choices = iterator
 
 
 # -----------------------
@@ -25,8 +56,21 @@ class LetterForm(forms.ModelForm):
             "delivery_date": forms.DateTimeInput(
                 attrs={"type": "datetime-local", "class": "form-control"}
             ),
+            "receivers": SearchPickerWidget(reverse_lazy("search_receivers")),
+            "memories": SearchPickerWidget(reverse_lazy("search_memories")),
+            "diary_entries": SearchPickerWidget(reverse_lazy("search_diaries")),
         }
 
+    def __init__(self, *args, **kwargs):
+        self.user = kwargs.pop("user", None)
+        super().__init__(*args, **kwargs)
+
+        # Submitted ids are only checked against the sender's own rows
+        self.fields["receivers"].queryset = CustomUser.objects.filter(is_active=True)
+        self.fields["memories"].queryset = Memory.objects.filter(owner=self.user)
+        self.fields["diary_entries"].queryset = DailyDiary.objects.filter(owner=self.user)
+        self.fields["diary_entries"].label_from_instance = lambda diary: f"Diary entry for {diary.entry_date}"
+
     def save(self, commit=True):
         # Save basic letter
         letter = super().save(commit=False)
@@ -111,7 +155,7 @@ class ProfileForm(forms.ModelForm):
         required=False,
         widget=forms.DateInput(attrs={"type": "text", "class": "form-control datepicker-icon"})
     )
-    profile_picture = forms.ImageField(
+    profile_picture = NormalizedImageField(
         required=False,
         widget=forms.ClearableFileInput(attrs={'style': 'display:none;'})  
     )
@@ -135,6 +179,7 @@ class ProfileForm(forms.ModelForm):
 # Memory Form
 # -----------------------
 class MemoryForm(forms.ModelForm):
+    photo = NormalizedImageField(required=False)
     tags_input = forms.CharField(
         required=False,
         widget=forms.TextInput(attrs={"placeholder": "Add tags... #tag1 #tag2", "class": "tags-input"}),
@@ -171,35 +216,33 @@ class MemoryForm(forms.ModelForm):
                 self.fields['location_input'].initial = self.instance.location.name
 
     def clean_tags_input(self):
+        # Names only; rows are resolved in bulk when the form is saved
         tags_str = self.cleaned_data.get("tags_input", "")
-        tags_list = [t.strip().lstrip('#') for t in tags_str.split() if t.strip()]
-        tags_objs = []
-        for t in tags_list:
-            tag, _ = Tag.objects.get_or_create(name__iexact=t, defaults={"name": t})
-            tags_objs.append(tag)
-        return tags_objs
+        return [t.strip().lstrip('#') for t in tags_str.split() if t.strip().lstrip('#')]
 
     def clean_location_input(self):
-        loc_str = self.cleaned_data.get("location_input", "").strip()
-        if not loc_str:
-            return None
-        loc_obj, _ = Location.objects.get_or_create(name__iexact=loc_str, defaults={"name": loc_str})
-        return loc_obj
+        return self.cleaned_data.get("location_input", "").strip()
 
     def save(self, commit=True):
         memory = super().save(commit=False)
-        memory.location = self.cleaned_data.get('location_input')
+        loc_str = self.cleaned_data.get('location_input')
+        memory.location = resolve_locations([loc_str])[0] if loc_str else None
         if commit:
             memory.save()
-            memory.tags.set(self.cleaned_data.get('tags_input', []))
+            self._save_m2m()
         return memory
 
+    def _save_m2m(self):
+        # Also runs for save(commit=False) followed by form.save_m2m()
+        super()._save_m2m()
+        self.instance.tags.set(resolve_tags(self.cleaned_data.get('tags_input', [])))
+
 
 # -----------------------
 # Daily Diary Form
 # -----------------------
 class DailyDiaryForm(forms.ModelForm):
-    photo = forms.ImageField(required=False, label="Photo")
+    photo = NormalizedImageField(required=False, label="Photo")
     locations_input = forms.CharField(
         required=False,
         widget=forms.TextInput(attrs={"placeholder": "Enter locations...", "class": "location-input"}),
@@ -249,12 +292,7 @@ class DailyDiaryForm(forms.ModelForm):
         # Handle locations
         loc_str = self.cleaned_data.get("locations_input", "")
         loc_names = [l.strip() for l in loc_str.split(",") if l.strip()]
-        diary.locations.set([])  # clear first
-        for loc_name in loc_names:
-            loc_obj, _ = Location.objects.get_or_create(
-                name__iexact=loc_name, defaults={"name": loc_name}
-            )
-            diary.locations.add(loc_obj)
+        diary.locations.set(resolve_locations(loc_names))
 
         # Handle attached memories
         memory_ids = self.data.get("selected_memories", "")
@@ -0,0 +1,74 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from .models import Letter, LetterRecipient
+
+logger = logging.getLogger(__name__)
+
+
+# ----------------------------
+# Bulk letter lifecycle transitions
+# ----------------------------
+# Each transition is an UPDATE ... WHERE pk IN (SELECT ... LIMIT n) repeated
+# until nothing matches, so no letter is ever loaded into Python and each
+# statement holds its locks only briefly.
+
+def _update_in_batches(queryset, batch_size, **values):
+    touched = 0
+    while True:
+        updated = Letter.objects.filter(pk__in=queryset.values("pk")[:batch_size]).update(**values)
+        touched += updated
+        if updated < batch_size:
+            return touched
+
+
+def lock_expired_letters(now, batch_size):
+    # Scheduled letters can be edited for grace_period_hours after they were
+    # written. Integer-times-interval arithmetic isn't portable (SQLite), and
+    # there are only a handful of distinct grace periods, so run one ranged
+    # UPDATE per value instead.
+    # The payload was frozen when the letter was scheduled or last edited, and
+    # a locked letter can no longer change, so nothing needs re-rendering here.
+    scheduled = Letter.objects.filter(status="scheduled")
+    touched = 0
+    for hours in scheduled.values_list("grace_period_hours", flat=True).distinct().order_by():
+        expired = scheduled.filter(grace_period_hours=hours, created_at__lte=now - timedelta(hours=hours))
+        touched += _update_in_batches(expired, batch_size, status="locked", locked_at=now, updated_at=now)
+    return touched
+
+
+def mark_delivered(now, batch_size):
+    # Letters left in "sending" whose recipients are all resolved, e.g. when a
+    # worker died between recording results and finishing the letter.
+    pending = LetterRecipient.objects.filter(letter=OuterRef("pk"), status="pending")
+    sent = LetterRecipient.objects.filter(letter=OuterRef("pk"), status="sent")
+    settled = Letter.objects.filter(status="sending").exclude(Exists(pending))
+    delivered = _update_in_batches(settled.filter(Exists(sent)), batch_size, status="delivered", updated_at=now)
+    failed = _update_in_batches(settled.exclude(Exists(sent)), batch_size, status="failed", updated_at=now)
+    return delivered, failed
+
+
+def archive_delivered_letters(now, batch_size):
+    # The frozen email body holds decrypted diary excerpts; once a letter is
+    # archived nothing will send it again, so drop it.
+    cutoff = now - timedelta(days=settings.LETTER_ARCHIVE_AFTER_DAYS)
+    old = Letter.objects.filter(status="delivered", delivery_date__lt=cutoff)
+    return _update_in_batches(old, batch_size, status="archived", rendered_html="", updated_at=now)
+
+
+def run_lifecycle(now=None, batch_size=None):
+    now = now or timezone.now()
+    batch_size = batch_size or settings.LETTER_LIFECYCLE_BATCH_SIZE
+    delivered, failed = mark_delivered(now, batch_size)
+    touched = {
+        "locked": lock_expired_letters(now, batch_size),
+        "delivered": delivered,
+        "failed": failed,
+        "archived": archive_delivered_letters(now, batch_size),
+    }
+    logger.info("letter lifecycle %s", " ".join(f"{name}={count}" for name, count in touched.items()))
+    return touched
@@ -0,0 +1,39 @@
+import os
+import threading
+
+import brevo_python
+from django.conf import settings
+
+
+# ----------------------------
+# Shared Brevo client
+# ----------------------------
+_api_lock = threading.Lock()
+_api_instance = None
+
+
+def get_brevo_api():
+    # One client per process. ApiClient sits on a urllib3 PoolManager, which is
+    # thread-safe, so every sender reuses the same keep-alive connections
+    # instead of opening a fresh TLS session per email.
+    global _api_instance
+    if _api_instance is None:
+        with _api_lock:
+            if _api_instance is None:
+                configuration = brevo_python.Configuration()
+                configuration.host = settings.BREVO_API_HOST
+                configuration.api_key['api-key'] = os.getenv('BREVO_API_KEY', settings.BREVO_API_KEY)
+                configuration.connection_pool_maxsize = max(settings.LETTER_DELIVERY_CONCURRENCY, 4)
+                _api_instance = brevo_python.TransactionalEmailsApi(brevo_python.ApiClient(configuration))
+    return _api_instance
+
+
+def reset_brevo_api():
+    # Drop the shared client, e.g. after BREVO_API_HOST changed
+    global _api_instance
+    with _api_lock:
+        _api_instance = None
+
+
+def default_sender():
+    return {"name": "DearMe App", "email": os.getenv("BREVO_SENDER_EMAIL", settings.BREVO_SENDER_EMAIL)}
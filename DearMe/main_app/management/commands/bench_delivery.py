@@ -0,0 +1,92 @@
+import statistics
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+from django.utils import timezone
+from main_app.delivery import deliver_due_letters
+from main_app.fakebrevo import FakeBrevoServer
+from main_app.mail import reset_brevo_api
+from main_app.models import CustomUser, Letter, OutboundEmail
+
+class Command(BaseCommand):
+    help = "Measure send_due_letters throughput against the local fake Brevo server (rolled back afterwards)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--letters", type=int, default=2_000)
+        parser.add_argument("--concurrency", type=int, default=8)
+        parser.add_argument("--batch-size", type=int, default=200)
+        parser.add_argument("--latency-ms", type=float, default=50, help="Mean fake provider latency")
+        parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of sends answered with 500")
+        parser.add_argument("--rate-limit", type=int, default=0, help="Provider requests per second (0 = unlimited)")
+        parser.add_argument("--backoff-base", type=int, default=1, help="Retry backoff base in seconds")
+        parser.add_argument("--timeout", type=int, default=300, help="Give up on retries after this many seconds")
+
+    def handle(self, *args, **options):
+        server = FakeBrevoServer(
+            latency=options["latency_ms"] / 1000,
+            error_rate=options["error_rate"],
+            rate_limit=options["rate_limit"],
+        )
+        server.start()
+
+        try:
+            with override_settings(BREVO_API_HOST=server.host, OUTBOX_BACKOFF_BASE_SECONDS=options["backoff_base"]), \
+                    transaction.atomic():
+                reset_brevo_api()
+                sender = self.seed(options["letters"])
+                self.run(options, OutboundEmail.objects.filter(letter__sender=sender))
+                # Nothing seeded here should survive the benchmark
+                transaction.set_rollback(True)
+        finally:
+            reset_brevo_api()
+            server.shutdown()
+            server.server_close()
+
+        self.stdout.write(f"Fake provider: {server.stats}")
+
+    def seed(self, count):
+        sender = CustomUser.objects.create(username=f"bench-{int(time.time())}", email=f"bench-{time.time()}@example.com")
+        now = timezone.now()
+        Letter.objects.bulk_create(
+            [Letter(sender=sender, subject=f"Bench {i}", body="<p>Hello from the past</p>", status="scheduled",
+                    delivery_date=now, external_emails=f"reader{i}@example.com") for i in range(count)],
+            batch_size=1_000,
+        )
+        return sender
+
+    def run(self, options, emails):
+        started = time.monotonic()
+        latencies, sent, runs = [], 0, 0
+
+        # Keep running the delivery pass until every message is sent or dead,
+        # sleeping until the next retry like the daemon would.
+        while time.monotonic() - started < options["timeout"]:
+            report = deliver_due_letters(concurrency=options["concurrency"], batch_size=options["batch_size"])
+            latencies += report.latencies
+            sent += len(report.sent)
+            runs += 1
+            if not emails.filter(status="pending").exists():
+                break
+            next_retry = emails.filter(status="pending").order_by("next_attempt_at").first()
+            time.sleep(max((next_retry.next_attempt_at - timezone.now()).total_seconds(), 0.05))
+
+        elapsed = time.monotonic() - started
+        attempts = Counter(emails.values_list("attempts", flat=True))
+        statuses = Counter(emails.values_list("status", flat=True))
+        latencies_ms = sorted(latency * 1000 for latency in latencies)
+
+        self.stdout.write(self.style.MIGRATE_HEADING("Delivery benchmark"))
+        self.stdout.write(f"Letters: {options['letters']}, concurrency {options['concurrency']}, "
+                          f"batch size {options['batch_size']}, {runs} delivery passes")
+        self.stdout.write(f"Sent {sent} in {elapsed:.2f}s: {sent / elapsed:.1f} letters/s")
+        if latencies_ms:
+            self.stdout.write(f"Send latency p50 {statistics.median(latencies_ms):.1f} ms, "
+                              f"p99 {latencies_ms[int(len(latencies_ms) * 0.99) - 1]:.1f} ms "
+                              f"over {len(latencies_ms)} requests")
+        self.stdout.write(f"Outbox status: {dict(statuses)}")
+        self.stdout.write(f"Attempts per message: {dict(sorted(attempts.items()))}")
+        if emails.filter(status="pending").exists():
+            self.stdout.write(self.style.WARNING("Timed out with messages still pending"))
@@ -0,0 +1,57 @@
+import statistics
+import time
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from main_app.models import CustomUser, DailyDiary
+from main_app.pagination import keyset_paginate
+
+class Command(BaseCommand):
+    help = "Compare diary list page load with full rows vs. the deferred preview column (rolled back afterwards)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--entries", type=int, default=2_000, help="Diary entries to seed")
+        parser.add_argument("--text-chars", type=int, default=4_000, help="Length of each entry's text")
+        parser.add_argument("--repeat", type=int, default=20, help="Timed runs per variant")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            owner = self.seed(options["entries"], options["text_chars"])
+            diaries = DailyDiary.objects.filter(owner=owner)
+            self.measure("Full rows (before)", diaries, options["repeat"])
+            self.measure("Preview only", diaries.only("entry_date", "preview"), options["repeat"])
+
+            # Nothing seeded here should survive the benchmark
+            transaction.set_rollback(True)
+
+    def seed(self, entries, text_chars):
+        owner = CustomUser.objects.create(username=f"bench-{int(time.time())}", email=f"bench-{time.time()}@example.com")
+        text = ("Dear diary, today was a long day. " * (text_chars // 34 + 1))[:text_chars]
+        started = time.monotonic()
+        DailyDiary.objects.bulk_create(
+            [DailyDiary(owner=owner, entry_date=date(2000, 1, 1) + timedelta(days=i), text=text,
+                        favorite_music="Song A, Song B", favorite_foods="Ramen", favorite_shows="Show X",
+                        preview=DailyDiary.make_preview(text)) for i in range(entries)],
+            batch_size=500,
+        )
+        self.stdout.write(f"Seeded {entries} entries of {text_chars} chars in {time.monotonic() - started:.1f}s")
+        return owner
+
+    def measure(self, label, queryset, repeat):
+        page_size = settings.LIST_PAGE_SIZE
+        # The first page, and one deep into the list through its cursor
+        deep_cursor = keyset_paginate(queryset.only("entry_date"), DailyDiary._meta.ordering, page_size=queryset.count() // 2).next_cursor
+
+        self.stdout.write(self.style.MIGRATE_HEADING(label))
+        for name, cursor in (("first page", None), ("deep page", deep_cursor)):
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                keyset_paginate(queryset, DailyDiary._meta.ordering, cursor, page_size)
+                timings.append((time.perf_counter() - started) * 1000)
+            self.stdout.write(
+                f"{name}: p50 {statistics.median(timings):.2f} ms, max {max(timings):.2f} ms "
+                f"for {page_size} entries over {repeat} runs"
+            )
@@ -0,0 +1,79 @@
+import random
+import statistics
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+from main_app.delivery import due_letters
+from main_app.models import CustomUser, Letter
+from main_app.outbox import lease_free
+
+class Command(BaseCommand):
+    help = "Seed letters and compare the due-letter scan with and without the delivery indexes (rolled back afterwards)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=1_000_000, help="Total letters to seed")
+        parser.add_argument("--due", type=int, default=1_000, help="How many of them are due right now")
+        parser.add_argument("--repeat", type=int, default=20, help="Timed runs per variant")
+        parser.add_argument("--batch-size", type=int, default=200, help="LIMIT used by the scan")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.seed(options["rows"], options["due"])
+            indexes = [index for index in Letter._meta.indexes if index.name in ("letter_due_idx", "letter_status_delivery_idx")]
+
+            # Plain DDL statements rather than the schema editor's context
+            # manager, which SQLite refuses to enter inside a transaction.
+            editor = connection.schema_editor()
+            with connection.cursor() as cursor:
+                for index in indexes:
+                    cursor.execute(f"DROP INDEX {connection.ops.quote_name(index.name)}")
+            self.measure("Without indexes", options["repeat"], options["batch_size"])
+
+            with connection.cursor() as cursor:
+                for index in indexes:
+                    cursor.execute(str(index.create_sql(Letter, editor)))
+            self.measure("With indexes", options["repeat"], options["batch_size"])
+
+            # Nothing seeded here should survive the benchmark
+            transaction.set_rollback(True)
+
+    def seed(self, rows, due):
+        now = timezone.now()
+        sender = CustomUser.objects.create(username=f"bench-{int(time.time())}", email=f"bench-{time.time()}@example.com")
+        started = time.monotonic()
+        batch = []
+        for i in range(rows):
+            if i < due:
+                status, delivery_date = "scheduled", now - timedelta(minutes=random.randint(1, 120))
+            elif i % 10:
+                # Most letters ever written have already been delivered
+                status, delivery_date = "delivered", now - timedelta(days=random.randint(1, 3650))
+            else:
+                status, delivery_date = "scheduled", now + timedelta(days=random.randint(1, 3650))
+            batch.append(Letter(sender=sender, subject="bench", body="", status=status, delivery_date=delivery_date))
+            if len(batch) == 10_000:
+                Letter.objects.bulk_create(batch)
+                batch = []
+        Letter.objects.bulk_create(batch)
+        self.stdout.write(f"Seeded {rows} letters ({due} due) in {time.monotonic() - started:.1f}s")
+
+    def measure(self, label, repeat, batch_size):
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+        now = timezone.now()
+        query = due_letters(now).filter(lease_free(now)).order_by("delivery_date").values_list("pk", flat=True)[:batch_size]
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            list(query.all())  # fresh clone, not the cached result
+            timings.append((time.perf_counter() - started) * 1000)
+
+        self.stdout.write(self.style.MIGRATE_HEADING(label))
+        self.stdout.write(query.explain())
+        self.stdout.write(
+            f"p50 {statistics.median(timings):.2f} ms, max {max(timings):.2f} ms over {repeat} runs"
+        )
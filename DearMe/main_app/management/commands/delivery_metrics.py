@@ -0,0 +1,22 @@
+import json
+
+from django.core.management.base import BaseCommand
+from main_app.metrics import collect_delivery_metrics, prune_attempts, render_prometheus
+
+class Command(BaseCommand):
+    help = "Print delivery lag, provider latency, failures and queue depth"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--window", type=int, help="Seconds of history to include (--json)")
+        parser.add_argument("--json", action="store_true", help="Output JSON instead of Prometheus text")
+        parser.add_argument("--prune", action="store_true", help="Delete attempt records older than METRICS_RETENTION_DAYS")
+
+    def handle(self, *args, **options):
+        if options["prune"]:
+            self.stdout.write(f"Pruned {prune_attempts()} attempt records")
+            return
+
+        if options["json"]:
+            self.stdout.write(json.dumps(collect_delivery_metrics(options["window"]), indent=2))
+        else:
+            self.stdout.write(render_prometheus(), ending="")
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from main_app.lifecycle import run_lifecycle
+
+class Command(BaseCommand):
+    help = "Lock letters past their grace window, settle finished deliveries and archive old letters"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, help="Rows updated per statement")
+
+    def handle(self, *args, **options):
+        touched = run_lifecycle(batch_size=options["batch_size"])
+        for transition, count in touched.items():
+            self.stdout.write(f"{transition}: {count}")
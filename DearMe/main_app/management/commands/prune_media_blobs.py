@@ -0,0 +1,17 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from main_app.attachments import prune_encoded
+from main_app.storage import prune_blobs
+
+class Command(BaseCommand):
+    help = f"Delete uploaded files no memory, diary, letter or profile has referenced for MEDIA_BLOB_GRACE_HOURS ({settings.MEDIA_BLOB_GRACE_HOURS}h)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Only report what would be deleted")
+
+    def handle(self, *args, **options):
+        removed, freed = prune_blobs(dry_run=options["dry_run"])
+        verb = "Would delete" if options["dry_run"] else "Deleted"
+        self.stdout.write(f"{verb} {removed} files ({freed / 1_048_576:.1f} MiB)")
+        removed, freed = prune_encoded(dry_run=options["dry_run"])
+        self.stdout.write(f"{verb} {removed} cached attachment encodings ({freed / 1_048_576:.1f} MiB)")
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from main_app.memory_search import clear_index, index_memory
+from main_app.models import Memory
+
+class Command(BaseCommand):
+    help = "Rebuild the memory full-text search index from scratch"
+
+    def handle(self, *args, **options):
+        memories = Memory.objects.select_related("location").prefetch_related("tags").order_by("pk")
+        count = 0
+        # Emptied first, so rows of memories deleted behind the signals'
+        # back (raw SQL, a restored backup) go too. One transaction: searches
+        # see the old index until the new one is complete.
+        with transaction.atomic():
+            clear_index()
+            for memory in memories.iterator(chunk_size=500):
+                index_memory(memory)
+                count += 1
+        self.stdout.write(f"Indexed {count} memories")
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from main_app.models import DailyDiary
+
+class Command(BaseCommand):
+    help = "Rebuild the diary search index (after enabling search or changing DIARY_SEARCH_KEY)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", help="Only reindex this username's entries")
+
+    def handle(self, *args, **options):
+        diaries = DailyDiary.objects.only("owner", *DailyDiary.SEARCHABLE_FIELDS).order_by("pk")
+        if options["user"]:
+            diaries = diaries.filter(owner__username=options["user"])
+
+        count = 0
+        for diary in diaries.iterator(chunk_size=500):
+            diary.reindex_search()
+            count += 1
+        self.stdout.write(f"Reindexed {count} diary entries")
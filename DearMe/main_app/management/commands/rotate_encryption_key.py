@@ -0,0 +1,169 @@
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cryptography.fernet
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
+from django.db.models import Max, Min
+from encrypted_model_fields.fields import EncryptedMixin, get_crypter, parse_key
+from main_app.models import DailyDiary, Letter, OutboundEmail
+
+# Every model with encrypted columns
+MODELS = (DailyDiary, Letter, OutboundEmail)
+
+
+def encrypted_columns(model):
+    return [field.column for field in model._meta.concrete_fields if isinstance(field, EncryptedMixin)]
+
+
+def rotate_chunk(table, pk_column, columns, low, high, rows_per_second):
+    # Runs in a worker process. Reads one primary-key range with plain SQL
+    # (no model save(), so updated_at and the search index are untouched)
+    # and rewrites every value not already encrypted with the first key.
+    started = time.monotonic()
+    crypter = get_crypter()
+    keys = settings.FIELD_ENCRYPTION_KEY
+    primary = parse_key(keys[0] if isinstance(keys, (list, tuple)) else keys)
+    qn = connection.ops.quote_name
+    rotated = unreadable = 0
+
+    # The chunk's rows stay locked from the read to the write, so a user
+    # edit committed in between can't be overwritten with the re-encrypted
+    # old value. SQLite has no FOR UPDATE, but refuses to let a transaction
+    # write after another connection committed past its read: the chunk then
+    # fails instead, and a rerun resumes from the checkpoint.
+    lock = " FOR UPDATE" if connection.features.has_select_for_update else ""
+
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT {qn(pk_column)}, {', '.join(qn(c) for c in columns)} FROM {qn(table)} "
+                f"WHERE {qn(pk_column)} >= %s AND {qn(pk_column)} < %s{lock}",
+                [low, high],
+            )
+            updates = []
+            for pk, *values in cursor.fetchall():
+                new_values = []
+                for value in values:
+                    if not value:
+                        new_values.append(value)
+                        continue
+                    token = value.encode() if isinstance(value, str) else bytes(value)
+                    try:
+                        primary.decrypt(token)
+                        new_values.append(value)  # already on the new key
+                        continue
+                    except cryptography.fernet.InvalidToken:
+                        pass
+                    try:
+                        new_values.append(crypter.rotate(token).decode())
+                        rotated += 1
+                    except cryptography.fernet.InvalidToken:
+                        # Neither key opens it (or legacy plaintext): leave as is
+                        new_values.append(value)
+                        unreadable += 1
+                if new_values != values:
+                    updates.append([*new_values, pk])
+            if updates:
+                cursor.executemany(
+                    f"UPDATE {qn(table)} SET {', '.join(f'{qn(c)} = %s' for c in columns)} "
+                    f"WHERE {qn(pk_column)} = %s",
+                    updates,
+                )
+
+    # Throttle: this chunk may not finish faster than its share of the write rate
+    if rows_per_second and updates:
+        time.sleep(max(len(updates) / rows_per_second - (time.monotonic() - started), 0))
+    return table, low, rotated, unreadable
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-encrypt every encrypted column with the first FIELD_ENCRYPTION_KEY. "
+        "Set FIELD_ENCRYPTION_KEY=new,old while this runs, then drop the old key."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=1_000, help="Primary-key range per chunk")
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes")
+        parser.add_argument("--max-rows-per-second", type=float, default=0, help="Write throttle across all workers (0 = unlimited)")
+        parser.add_argument("--checkpoint", default=str(settings.BASE_DIR / ".cache" / "key_rotation.json"),
+                            help="File recording finished chunks, so an interrupted run can resume")
+        parser.add_argument("--restart", action="store_true", help="Ignore an existing checkpoint")
+
+    def handle(self, *args, **options):
+        keys = settings.FIELD_ENCRYPTION_KEY
+        if not isinstance(keys, (list, tuple)) or len(keys) < 2:
+            raise CommandError("Set FIELD_ENCRYPTION_KEY to 'new_key,old_key' so both keys are available.")
+        if connection.vendor == "sqlite" and options["workers"] > 1:
+            self.stdout.write(self.style.WARNING("SQLite allows one writer at a time; using a single worker."))
+            options["workers"] = 1
+
+        chunk_size = options["chunk_size"]
+        checkpoint = self.load_checkpoint(options["checkpoint"], keys[0], chunk_size, options["restart"])
+        rate = options["max_rows_per_second"] / options["workers"] if options["max_rows_per_second"] else 0
+
+        jobs = []
+        for model in MODELS:
+            table, pk_column = model._meta.db_table, model._meta.pk.column
+            bounds = model.objects.aggregate(low=Min("pk"), high=Max("pk"))
+            if bounds["low"] is None:
+                continue
+            done = set(checkpoint["done"].get(table, []))
+            for low in range(bounds["low"], bounds["high"] + 1, chunk_size):
+                if low not in done:
+                    jobs.append((table, pk_column, encrypted_columns(model), low, low + chunk_size, rate))
+
+        self.stdout.write(f"{len(jobs)} chunks to process with {options['workers']} workers")
+        started = time.monotonic()
+        rotated = unreadable = 0
+
+        # Forked workers must not share the parent's database connection
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=options["workers"]) as pool:
+            futures = [pool.submit(rotate_chunk, *job) for job in jobs]
+            for finished, future in enumerate(as_completed(futures), 1):
+                table, low, chunk_rotated, chunk_unreadable = future.result()
+                rotated += chunk_rotated
+                unreadable += chunk_unreadable
+                checkpoint["done"].setdefault(table, []).append(low)
+                self.save_checkpoint(options["checkpoint"], checkpoint)
+
+                elapsed = time.monotonic() - started
+                self.stdout.write(
+                    f"[{finished}/{len(jobs)}] {table} from pk {low}: {chunk_rotated} values rotated, "
+                    f"{rotated / elapsed:.0f} values/s overall"
+                )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Rotated {rotated} values in {time.monotonic() - started:.1f}s. You can now remove the old key."
+        ))
+        if unreadable:
+            self.stdout.write(self.style.WARNING(f"{unreadable} values could not be decrypted with either key and were left as is."))
+        if not settings.DIARY_SEARCH_KEY:
+            self.stdout.write("The diary search index is keyed off FIELD_ENCRYPTION_KEY: run reindex_diaries.")
+
+    def load_checkpoint(self, path, new_key, chunk_size, restart):
+        # Tied to the new key and chunk size; anything else starts over
+        fingerprint = hashlib.sha256(new_key.encode()).hexdigest()[:16]
+        fresh = {"key": fingerprint, "chunk_size": chunk_size, "done": {}}
+        if restart or not os.path.exists(path):
+            return fresh
+        with open(path) as f:
+            checkpoint = json.load(f)
+        if checkpoint.get("key") != fingerprint or checkpoint.get("chunk_size") != chunk_size:
+            self.stdout.write("Checkpoint is for a different key or chunk size; starting over.")
+            return fresh
+        self.stdout.write(f"Resuming from {path}")
+        return checkpoint
+
+    def save_checkpoint(self, path, checkpoint):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(checkpoint, f)
+        os.replace(tmp, path)
@@ -0,0 +1,34 @@
+import signal
+
+from django.core.management.base import BaseCommand
+from main_app.scheduler import DeliveryScheduler
+
+class Command(BaseCommand):
+    help = "Long-running worker that delivers letters within seconds of their delivery date"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--poll-interval", type=int, help="Seconds between checks for new or edited letters")
+        parser.add_argument("--horizon", type=int, help="Seconds of upcoming letters held in memory")
+        parser.add_argument("--concurrency", type=int, help="Number of parallel sends")
+        parser.add_argument("--batch-size", type=int, help="Letters loaded per query")
+
+    def handle(self, *args, **options):
+        scheduler = DeliveryScheduler(
+            poll_interval=options["poll_interval"],
+            horizon=options["horizon"],
+            concurrency=options["concurrency"],
+            batch_size=options["batch_size"],
+            on_report=self.report,
+        )
+        signal.signal(signal.SIGTERM, scheduler.stop)
+        signal.signal(signal.SIGINT, scheduler.stop)
+
+        self.stdout.write(f"Delivery daemon {scheduler.worker_id} started")
+        scheduler.run()
+        self.stdout.write("Delivery daemon stopped")
+
+    def report(self, report):
+        self.stdout.write(
+            f"Queued {report.enqueued} letters. Sent {len(report.sent)}, failed {len(report.failed)} "
+            f"in {report.elapsed:.2f}s ({report.rate:.1f} letters/s)"
+        )
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from main_app.fakebrevo import FakeBrevoServer
+
+class Command(BaseCommand):
+    help = "Run a local fake of Brevo's transactional email API (point BREVO_API_HOST at it)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--port", type=int, default=8025)
+        parser.add_argument("--latency-ms", type=float, default=50, help="Mean response latency")
+        parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 500")
+        parser.add_argument("--rate-limit", type=int, default=0, help="Requests per second before 429s (0 = unlimited)")
+
+    def handle(self, *args, **options):
+        server = FakeBrevoServer(
+            ("127.0.0.1", options["port"]),
+            latency=options["latency_ms"] / 1000,
+            error_rate=options["error_rate"],
+            rate_limit=options["rate_limit"],
+        )
+        self.stdout.write(f"Fake Brevo listening on {server.host}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            self.stdout.write(f"Stats: {server.stats}")
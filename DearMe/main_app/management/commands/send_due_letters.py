@@ -1,14 +1,27 @@
 from django.core.management.base import BaseCommand
-from django.utils import timezone
-from main_app.models import Letter
+from main_app.delivery import deliver_due_letters
 
 class Command(BaseCommand):
-    help = "Send letters that are due"
-
-    def handle(self, *args, **kwargs):
-        due_letters = Letter.objects.filter(status='scheduled', delivery_date__lte=timezone.now())
-        for letter in due_letters:
-            if letter.send_email_brevo():
-                self.stdout.write(self.style.SUCCESS(f"Letter {letter.pk} sent successfully"))
-            else:
-                self.stdout.write(self.style.ERROR(f"Letter {letter.pk} failed to send"))
+    help = "Queue letters that are due and send everything waiting in the outbox"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--concurrency", type=int, help="Number of parallel sends")
+        parser.add_argument("--batch-size", type=int, help="Letters loaded per query")
+
+    def handle(self, *args, **options):
+        report = deliver_due_letters(
+            concurrency=options["concurrency"],
+            batch_size=options["batch_size"],
+            on_result=self.report_letter,
+        )
+        self.stdout.write(
+            f"Queued {report.enqueued} letters. Sent {len(report.sent)}, failed {len(report.failed)} "
+            f"in {report.elapsed:.2f}s ({report.rate:.1f} letters/s)"
+        )
+
+    def report_letter(self, email, error):
+        label = f"Letter {email.letter_id}" if email.letter_id else f"{email.get_kind_display()} email {email.pk}"
+        if error is None:
+            self.stdout.write(self.style.SUCCESS(f"{label} sent successfully"))
+        else:
+            self.stdout.write(self.style.ERROR(f"{label} failed to send: {error}"))
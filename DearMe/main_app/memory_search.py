@@ -0,0 +1,106 @@
+import re
+
+from django.db import connection
+from django.db.models import Q
+
+# ----------------------------
+# Memory full-text search
+# ----------------------------
+# One index row per memory holding its title, description, tag names and
+# location name: an FTS5 table on SQLite, a tsvector column with a GIN index
+# on Postgres (tables created in migration 0023). The owner is indexed as a
+# token too, so the per-user filter is part of the index lookup rather than
+# a post-filter over every match. Other backends fall back to icontains.
+TABLE = "main_app_memory_search"
+WORD_RE = re.compile(r"\w+")
+
+
+def _owner_token(owner_id):
+    return f"owner{owner_id}"
+
+
+def _document(memory):
+    tags = " ".join(tag.name for tag in memory.tags.all())
+    location = str(memory.location) if memory.location_id else ""
+    return memory.title, memory.description or "", tags, location
+
+
+def index_memory(memory):
+    title, description, tags, location = _document(memory)
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            cursor.execute(f"DELETE FROM {TABLE} WHERE rowid = %s", [memory.pk])
+            cursor.execute(
+                f"INSERT INTO {TABLE} (rowid, owner, title, description, tags, location) VALUES (%s, %s, %s, %s, %s, %s)",
+                [memory.pk, _owner_token(memory.owner_id), title, description, tags, location],
+            )
+        elif connection.vendor == "postgresql":
+            cursor.execute(
+                f"""
+                INSERT INTO {TABLE} (memory_id, document) VALUES (%s,
+                    setweight(to_tsvector('simple', %s), 'A') || setweight(to_tsvector('simple', %s), 'B')
+                    || setweight(to_tsvector('simple', %s), 'C') || setweight(to_tsvector('simple', %s), 'D')
+                    || %s::tsvector)
+                ON CONFLICT (memory_id) DO UPDATE SET document = EXCLUDED.document
+                """,
+                [memory.pk, title, tags, location, description, _owner_token(memory.owner_id)],
+            )
+
+
+def remove_memory(pk):
+    if connection.vendor in ("sqlite", "postgresql"):
+        column = "rowid" if connection.vendor == "sqlite" else "memory_id"
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {TABLE} WHERE {column} = %s", [pk])
+
+
+def clear_index():
+    if connection.vendor in ("sqlite", "postgresql"):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {TABLE}")
+
+
+def rank_memories(query, owner_id=None, limit=50):
+    # Memory pks, best match first. Every word must match; the last one also
+    # matches as a prefix so results update while typing.
+    words = WORD_RE.findall(query.lower())
+    if not words:
+        return []
+
+    if connection.vendor == "sqlite":
+        content = "{title description tags location}"
+        terms = [f'{content}: "{word}"' for word in words[:-1]] + [f'{content}: "{words[-1]}"*']
+        if owner_id is not None:
+            terms.insert(0, f'owner:"{_owner_token(owner_id)}"')
+        with connection.cursor() as cursor:
+            # bm25 column weights: owner, title, description, tags, location
+            cursor.execute(
+                f"SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s "
+                f"ORDER BY bm25({TABLE}, 0, 10.0, 1.0, 5.0, 3.0) LIMIT %s",
+                [" AND ".join(terms), limit],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    if connection.vendor == "postgresql":
+        terms = [f"'{word}'" for word in words[:-1]] + [f"'{words[-1]}':*"]
+        if owner_id is not None:
+            terms.insert(0, f"'{_owner_token(owner_id)}'")
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT memory_id FROM {TABLE}, to_tsquery('simple', %s) query "
+                f"WHERE document @@ query ORDER BY ts_rank(document, query) DESC LIMIT %s",
+                [" & ".join(terms), limit],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    from .models import Memory
+
+    memories = Memory.objects.all()
+    if owner_id is not None:
+        memories = memories.filter(owner_id=owner_id)
+    for word in words:
+        memories = memories.filter(
+            Q(title__icontains=word) | Q(description__icontains=word)
+            | Q(tags__name__icontains=word) | Q(location__name__icontains=word)
+        )
+    return list(memories.values_list("pk", flat=True).distinct()[:limit])
@@ -0,0 +1,156 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from .models import DeliveryAttempt, DeliveryCounter, LetterRecipient
+
+
+# ----------------------------
+# Delivery metrics
+# ----------------------------
+# Upper bounds, Prometheus style (each bucket counts everything <= bound)
+LAG_BUCKETS_SECONDS = (1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600, 6 * 3600)
+LATENCY_BUCKETS_MS = (50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+def _histogram(queryset, bucket_filter, buckets):
+    # One aggregate query per histogram: a filtered COUNT per bucket
+    counts = queryset.aggregate(
+        count=Count("pk"),
+        **{f"le_{bound}": Count("pk", filter=bucket_filter(bound)) for bound in buckets},
+    )
+    return {
+        "buckets": [(bound, counts[f"le_{bound}"]) for bound in buckets],
+        "count": counts["count"],
+    }
+
+
+def collect_delivery_metrics(window_seconds=None):
+    # The last window_seconds, for reading by a person (delivery_metrics
+    # --json); the scrape endpoint uses the running totals below
+    from .delivery import due_emails, due_letters
+
+    now = timezone.now()
+    window_seconds = window_seconds or settings.METRICS_WINDOW_SECONDS
+    since = now - timedelta(seconds=window_seconds)
+
+    # Lag: how long after its delivery date each recipient actually got the letter
+    sent = LetterRecipient.objects.filter(status="sent", sent_at__gte=since)
+    lag = _histogram(
+        sent, lambda bound: Q(sent_at__lte=F("letter__delivery_date") + timedelta(seconds=bound)), LAG_BUCKETS_SECONDS
+    )
+
+    attempts = DeliveryAttempt.objects.filter(created_at__gte=since)
+    latency = _histogram(attempts, lambda bound: Q(latency_ms__lte=bound), LATENCY_BUCKETS_MS)
+    failures = dict(
+        attempts.exclude(error_class="").values_list("error_class").annotate(count=Count("pk")).order_by()
+    )
+
+    return {
+        "window_seconds": window_seconds,
+        "lag_seconds": lag,
+        "provider_latency_ms": latency,
+        "failures_by_class": failures,
+        # Due but not yet handed to the outbox, and outbox messages waiting to send
+        "due_letters": due_letters(now).count(),
+        "due_emails": due_emails(now).count(),
+        "attempts": latency["count"],
+    }
+
+
+# ----------------------------
+# Running totals (Prometheus)
+# ----------------------------
+# Prometheus wants counters and histograms that only go up, and computes
+# rates itself. Windowed counts drop as rows age out of the window or are
+# pruned, which reads as a counter reset, so each result also adds to a
+# DeliveryCounter row when it is recorded.
+def _observe(increments, name, value, buckets):
+    for bound in buckets:
+        if value <= bound:
+            increments[(f"{name}_bucket", f'le="{bound}"')] += 1
+    increments[(f"{name}_bucket", 'le="+Inf"')] += 1
+    increments[(f"{name}_sum", "")] += value
+    increments[(f"{name}_count", "")] += 1
+
+
+def count_results(attempts, lags):
+    # attempts: the DeliveryAttempt rows just recorded; lags: seconds between
+    # delivery date and sending, one per recipient sent
+    increments = defaultdict(float)
+    for attempt in attempts:
+        _observe(increments, "dearme_provider_latency_ms", attempt.latency_ms, LATENCY_BUCKETS_MS)
+        if attempt.error_class:
+            increments[("dearme_delivery_failures_total", f'error_class="{attempt.error_class}"')] += 1
+    for lag in lags:
+        _observe(increments, "dearme_delivery_lag_seconds", lag, LAG_BUCKETS_SECONDS)
+    _increment(increments)
+
+
+def _increment(increments):
+    # Sorted, so concurrent workers lock the rows in the same order
+    rows = sorted(increments.items())
+    if not rows:
+        return
+    if connection.vendor in ("sqlite", "postgresql"):
+        # One upsert for the whole batch
+        table = DeliveryCounter._meta.db_table
+        placeholders = ", ".join(["(%s, %s, %s)"] * len(rows))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {table} (name, labels, value) VALUES {placeholders} "
+                f"ON CONFLICT (name, labels) DO UPDATE SET value = {table}.value + excluded.value",
+                [param for (name, labels), value in rows for param in (name, labels, value)],
+            )
+        return
+    for (name, labels), value in rows:
+        counter, _ = DeliveryCounter.objects.get_or_create(name=name, labels=labels)
+        DeliveryCounter.objects.filter(pk=counter.pk).update(value=F("value") + value)
+
+
+def render_prometheus():
+    from .delivery import due_emails, due_letters
+
+    totals = {(name, labels): value for name, labels, value in DeliveryCounter.objects.values_list("name", "labels", "value")}
+    lines = []
+
+    def sample(name, labels=""):
+        value = totals.get((name, labels), 0)
+        value = int(value) if float(value).is_integer() else value  # 1234567, not 1.23457e+06
+        lines.append(f"{name}{{{labels}}} {value}" if labels else f"{name} {value}")
+
+    def histogram(name, help_text, buckets):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} histogram")
+        for bound in (*buckets, "+Inf"):
+            sample(f"{name}_bucket", f'le="{bound}"')
+        sample(f"{name}_sum")
+        sample(f"{name}_count")
+
+    histogram("dearme_delivery_lag_seconds", "Sent time minus delivery date, per recipient sent", LAG_BUCKETS_SECONDS)
+    histogram("dearme_provider_latency_ms", "Brevo call latency, per attempt", LATENCY_BUCKETS_MS)
+
+    lines.append("# HELP dearme_delivery_failures_total Failed provider calls by error class")
+    lines.append("# TYPE dearme_delivery_failures_total counter")
+    for name, labels in sorted(totals):
+        if name == "dearme_delivery_failures_total":
+            sample(name, labels)
+
+    now = timezone.now()
+    lines.append("# HELP dearme_due_letters Letters past their delivery date not yet queued")
+    lines.append("# TYPE dearme_due_letters gauge")
+    lines.append(f"dearme_due_letters {due_letters(now).count()}")
+    lines.append("# HELP dearme_due_emails Outbox messages due for sending")
+    lines.append("# TYPE dearme_due_emails gauge")
+    lines.append(f"dearme_due_emails {due_emails(now).count()}")
+    return "\n".join(lines) + "\n"
+
+
+def prune_attempts(days=None):
+    days = days or settings.METRICS_RETENTION_DAYS
+    deleted, _ = DeliveryAttempt.objects.filter(created_at__lt=timezone.now() - timedelta(days=days)).delete()
+    return deleted
@@ -0,0 +1,26 @@
+from django.conf import settings
+
+from .fields import end_request_cache, start_request_cache
+
+
+class DecryptionCacheMiddleware:
+    # Gives each request its own decryption cache when
+    # FIELD_DECRYPTION_CACHE = "request", and zeroes it once the response is
+    # built. A no-op in the other modes.
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if settings.FIELD_DECRYPTION_CACHE != "request":
+            return self.get_response(request)
+        token = start_request_cache()
+        try:
+            response = self.get_response(request)
+            # TemplateResponses render lazily; render now so every decrypt
+            # happens while the cache exists.
+            if hasattr(response, "render") and not response.is_rendered:
+                response.render()
+            return response
+        finally:
+            end_request_cache(token)
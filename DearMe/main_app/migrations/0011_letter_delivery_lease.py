@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-18 16:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0010_dailydiary_photo_delete_diaryphoto'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='letter',
+            name='claimed_by',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='letter',
+            name='lease_expires_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
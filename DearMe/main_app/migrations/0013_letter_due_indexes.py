@@ -0,0 +1,21 @@
+# Generated by Django 5.2.6 on 2026-10-18 16:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0012_outboundemail'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='letter',
+            index=models.Index(condition=models.Q(('status__in', ['scheduled', 'locked'])), fields=['delivery_date'], name='letter_due_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='letter',
+            index=models.Index(fields=['status', 'delivery_date'], name='letter_status_delivery_idx'),
+        ),
+    ]
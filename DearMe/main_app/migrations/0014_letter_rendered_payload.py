@@ -0,0 +1,29 @@
+# Generated by Django 5.2.6 on 2026-10-18 16:38
+
+import encrypted_model_fields.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0013_letter_due_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='letter',
+            name='rendered_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='letter',
+            name='rendered_html',
+            field=encrypted_model_fields.fields.EncryptedTextField(blank=True),
+        ),
+        migrations.AlterField(
+            model_name='outboundemail',
+            name='html_content',
+            field=encrypted_model_fields.fields.EncryptedTextField(),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.6 on 2026-10-18 16:40
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0015_letterrecipient'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeliveryAttempt',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('letter', 'Letter'), ('verification', 'Email verification'), ('password_reset', 'Password reset')], max_length=20)),
+                ('latency_ms', models.PositiveIntegerField()),
+                ('error_class', models.CharField(blank=True, max_length=50)),
+                ('created_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('outbound_email', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attempt_log', to='main_app.outboundemail')),
+            ],
+        ),
+    ]
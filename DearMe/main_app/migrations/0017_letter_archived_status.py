@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 16:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0016_deliveryattempt'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='letter',
+            name='status',
+            field=models.CharField(choices=[('draft', 'Draft'), ('scheduled', 'Scheduled'), ('locked', 'Locked'), ('sending', 'Sending'), ('delivered', 'Delivered'), ('failed', 'Failed to send'), ('archived', 'Archived')], default='draft', max_length=20),
+        ),
+    ]
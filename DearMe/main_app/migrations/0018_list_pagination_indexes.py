@@ -0,0 +1,21 @@
+# Generated by Django 5.2.6 on 2026-10-18 16:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0017_letter_archived_status'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='letter',
+            index=models.Index(fields=['sender', '-created_at'], name='letter_sender_list_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='memory',
+            index=models.Index(fields=['owner', '-memory_date', '-created_at'], name='memory_owner_list_idx'),
+        ),
+    ]
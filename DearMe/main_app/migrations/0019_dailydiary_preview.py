@@ -0,0 +1,30 @@
+# Generated by Django 5.2.6 on 2026-10-18 16:46
+
+import encrypted_model_fields.fields
+from django.db import migrations
+from django.utils.text import Truncator
+
+
+def fill_previews(apps, schema_editor):
+    # Historical models have no custom save(), so compute the preview here.
+    # One UPDATE per row: bulk_update's CASE expression would be passed
+    # through the encrypting field as if it were a value.
+    DailyDiary = apps.get_model("main_app", "DailyDiary")
+    for diary in DailyDiary.objects.only("text").iterator(chunk_size=500):
+        DailyDiary.objects.filter(pk=diary.pk).update(preview=Truncator(diary.text or "").chars(120))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0018_list_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dailydiary',
+            name='preview',
+            field=encrypted_model_fields.fields.EncryptedTextField(blank=True, editable=False),
+        ),
+        migrations.RunPython(fill_previews, migrations.RunPython.noop),
+    ]
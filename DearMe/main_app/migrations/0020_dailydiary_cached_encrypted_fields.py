@@ -0,0 +1,39 @@
+# Generated by Django 5.2.6 on 2026-10-18 16:47
+
+import main_app.fields
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0019_dailydiary_preview'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='dailydiary',
+            name='favorite_foods',
+            field=main_app.fields.CachedEncryptedTextField(blank=True, help_text='Optional: list your favorite foods'),
+        ),
+        migrations.AlterField(
+            model_name='dailydiary',
+            name='favorite_music',
+            field=main_app.fields.CachedEncryptedTextField(blank=True, help_text='Optional: list your favorite music or upload an MP3 file'),
+        ),
+        migrations.AlterField(
+            model_name='dailydiary',
+            name='favorite_shows',
+            field=main_app.fields.CachedEncryptedTextField(blank=True, help_text='Optional: list your favorite anime/TV shows or add links'),
+        ),
+        migrations.AlterField(
+            model_name='dailydiary',
+            name='preview',
+            field=main_app.fields.CachedEncryptedTextField(blank=True, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='dailydiary',
+            name='text',
+            field=main_app.fields.CachedEncryptedTextField(blank=True),
+        ),
+    ]
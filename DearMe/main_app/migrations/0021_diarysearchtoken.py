@@ -0,0 +1,28 @@
+# Generated by Django 5.2.6 on 2026-10-18 16:48
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0020_dailydiary_cached_encrypted_fields'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DiarySearchToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=32)),
+                ('diary', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_tokens', to='main_app.dailydiary')),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['token', 'owner'], name='diary_search_token_idx')],
+                'unique_together': {('diary', 'token')},
+            },
+        ),
+    ]
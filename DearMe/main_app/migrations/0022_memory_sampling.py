@@ -0,0 +1,22 @@
+# Generated by Django 5.2.6 on 2026-10-18 16:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0021_diarysearchtoken'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='memory',
+            name='times_shown',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='memory',
+            index=models.Index(fields=['owner', 'memory_type', 'id'], name='memory_owner_type_idx'),
+        ),
+    ]
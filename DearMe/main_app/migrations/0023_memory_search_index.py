@@ -0,0 +1,56 @@
+from django.db import migrations
+
+# Full-text index for memories, see main_app.memory_search. Backend specific,
+# so it is plain SQL outside the model state; other databases get nothing and
+# search falls back to icontains.
+
+def create_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE main_app_memory_search USING fts5("
+            "owner, title, description, tags, location, tokenize = 'unicode61 remove_diacritics 2')"
+        )
+        schema_editor.execute("""
+            INSERT INTO main_app_memory_search (rowid, owner, title, description, tags, location)
+            SELECT m.id, 'owner' || m.owner_id, m.title, m.description,
+                   COALESCE((SELECT group_concat(t.name, ' ') FROM main_app_memory_tags mt
+                             JOIN main_app_tag t ON t.id = mt.tag_id WHERE mt.memory_id = m.id), ''),
+                   COALESCE(l.name || ' ' || l.city || ' ' || l.country, '')
+            FROM main_app_memory m LEFT JOIN main_app_location l ON l.id = m.location_id
+        """)
+    elif vendor == "postgresql":
+        schema_editor.execute("""
+            CREATE TABLE main_app_memory_search (
+                memory_id bigint PRIMARY KEY REFERENCES main_app_memory (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED,
+                document tsvector NOT NULL
+            )
+        """)
+        schema_editor.execute("CREATE INDEX main_app_memory_search_gin ON main_app_memory_search USING gin (document)")
+        schema_editor.execute("""
+            INSERT INTO main_app_memory_search (memory_id, document)
+            SELECT m.id,
+                   setweight(to_tsvector('simple', m.title), 'A')
+                   || setweight(to_tsvector('simple', COALESCE((SELECT string_agg(t.name, ' ') FROM main_app_memory_tags mt
+                        JOIN main_app_tag t ON t.id = mt.tag_id WHERE mt.memory_id = m.id), '')), 'B')
+                   || setweight(to_tsvector('simple', COALESCE(concat_ws(' ', l.name, l.city, l.country), '')), 'C')
+                   || setweight(to_tsvector('simple', m.description), 'D')
+                   || ('owner' || m.owner_id)::tsvector
+            FROM main_app_memory m LEFT JOIN main_app_location l ON l.id = m.location_id
+        """)
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor in ("sqlite", "postgresql"):
+        schema_editor.execute("DROP TABLE main_app_memory_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0022_memory_sampling'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
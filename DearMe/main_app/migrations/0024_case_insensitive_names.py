@@ -0,0 +1,69 @@
+# Generated by Django 5.2.6 on 2026-10-18 16:54
+
+import django.db.models.functions.text
+from django.db import migrations, models
+from django.db.models.functions import Lower
+
+
+def _duplicate_groups(model):
+    # Rows grouped by the database's own lower(name), oldest first
+    groups = {}
+    for row in model.objects.annotate(name_key=Lower("name")).order_by("pk"):
+        groups.setdefault(row.name_key, []).append(row)
+    return [rows for rows in groups.values() if len(rows) > 1]
+
+
+def _repoint(through, column, other, keeper, duplicate):
+    # Move M2M rows to the keeper, dropping those that would be doubled
+    rows = through.objects.filter(**{column: duplicate})
+    rows.filter(**{f"{other}__in": through.objects.filter(**{column: keeper}).values(other)}).delete()
+    rows.update(**{column: keeper})
+
+
+def merge_duplicates(apps, schema_editor):
+    # Case variants created before the constraint ("Paris", "paris") are
+    # merged into the oldest row so the unique index can be built
+    Tag = apps.get_model("main_app", "Tag")
+    Location = apps.get_model("main_app", "Location")
+    Memory = apps.get_model("main_app", "Memory")
+    DailyDiary = apps.get_model("main_app", "DailyDiary")
+    memory_tags = Memory._meta.get_field("tags").remote_field.through
+    diary_locations = DailyDiary._meta.get_field("locations").remote_field.through
+
+    for keeper, *duplicates in _duplicate_groups(Tag):
+        for duplicate in duplicates:
+            _repoint(memory_tags, "tag", "memory", keeper, duplicate)
+            duplicate.delete()
+
+    for keeper, *duplicates in _duplicate_groups(Location):
+        for duplicate in duplicates:
+            _repoint(diary_locations, "location", "dailydiary", keeper, duplicate)
+            Memory.objects.filter(location=duplicate).update(location=keeper)
+            for field in ("country", "city", "latitude", "longitude"):
+                if getattr(keeper, field) in ("", None):
+                    setattr(keeper, field, getattr(duplicate, field))
+            duplicate.delete()
+        keeper.save()
+
+
+class Migration(migrations.Migration):
+    # The merge runs in a transaction of its own and commits before the
+    # constraints are added: on Postgres, CREATE INDEX fails on a table with
+    # pending deferred FK trigger events from the deletes.
+    atomic = False
+
+    dependencies = [
+        ('main_app', '0023_memory_search_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop, atomic=True),
+        migrations.AddConstraint(
+            model_name='location',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Lower('name'), name='location_name_ci_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='tag',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Lower('name'), name='tag_name_ci_unique'),
+        ),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 5.2.6 on 2026-10-18 16:59
+
+import main_app.models
+import main_app.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0024_case_insensitive_names'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='letter',
+            name='attachment_name',
+            field=models.CharField(blank=True, editable=False, max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='customuser',
+            name='profile_picture',
+            field=models.ImageField(blank=True, null=True, storage=main_app.storage.content_storage, upload_to=main_app.models.profile_pic_path),
+        ),
+        migrations.AlterField(
+            model_name='dailydiary',
+            name='audio',
+            field=models.FileField(blank=True, null=True, storage=main_app.storage.content_storage, upload_to=main_app.models.diary_file_path),
+        ),
+        migrations.AlterField(
+            model_name='dailydiary',
+            name='photo',
+            field=models.ImageField(blank=True, null=True, storage=main_app.storage.content_storage, upload_to=main_app.models.diary_file_path),
+        ),
+        migrations.AlterField(
+            model_name='letter',
+            name='attachment',
+            field=models.FileField(blank=True, null=True, storage=main_app.storage.content_storage, upload_to='letter_attachments/'),
+        ),
+        migrations.AlterField(
+            model_name='memory',
+            name='audio',
+            field=models.FileField(blank=True, null=True, storage=main_app.storage.content_storage, upload_to=main_app.models.memory_file_path),
+        ),
+        migrations.AlterField(
+            model_name='memory',
+            name='photo',
+            field=models.ImageField(blank=True, null=True, storage=main_app.storage.content_storage, upload_to=main_app.models.memory_file_path),
+        ),
+        migrations.AlterField(
+            model_name='memory',
+            name='video',
+            field=models.FileField(blank=True, null=True, storage=main_app.storage.content_storage, upload_to=main_app.models.memory_file_path),
+        ),
+        migrations.CreateModel(
+            name='MediaBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('size', models.BigIntegerField()),
+                ('refcount', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('orphaned_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('refcount', 0)), fields=['orphaned_at'], name='mediablob_orphaned_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+from django.db import migrations
+
+
+def clear_payloads(apps, schema_editor):
+    # Payloads frozen while email.html escaped the letter body would send the
+    # HTML as text. Undelivered letters drop theirs and are rendered again at
+    # enqueue time (see outbox.letter_html).
+    Letter = apps.get_model("main_app", "Letter")
+    # (The column is encrypted, so it can't be filtered on; rendered_at can.)
+    Letter.objects.filter(status__in=("draft", "scheduled", "locked"), rendered_at__isnull=False).update(
+        rendered_html="", rendered_at=None
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0025_content_addressed_media'),
+    ]
+
+    operations = [
+        migrations.RunPython(clear_payloads, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.6 on 2026-10-18 17:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0026_rerender_letter_payloads'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='memory',
+            index=models.Index(fields=['owner', 'memory_type', 'memory_date', 'id'], name='memory_owner_type_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='memory',
+            index=models.Index(fields=['owner', 'memory_type', 'times_shown', 'id'], name='memory_owner_type_shown_idx'),
+        ),
+    ]
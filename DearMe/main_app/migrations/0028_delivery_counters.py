@@ -0,0 +1,25 @@
+# Generated by Django 5.2.6 on 2026-10-18 17:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0027_memory_weighted_sampling_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeliveryCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('labels', models.CharField(blank=True, max_length=100)),
+                ('value', models.FloatField(default=0)),
+            ],
+            options={
+                'unique_together': {('name', 'labels')},
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+from django.db import migrations
+from django.db.models import Exists, OuterRef
+
+# Copied from DailyDiary.SEARCHABLE_FIELDS as of this migration
+SEARCHABLE_FIELDS = ("text", "favorite_music", "favorite_foods", "favorite_shows")
+
+
+def backfill_tokens(apps, schema_editor):
+    # Entries written before the blind index (0021) had no tokens, so search
+    # couldn't find them. Entries that already have tokens were indexed on
+    # save and are left alone; `manage.py reindex_diaries` redoes everything.
+    from main_app.search import text_tokens
+
+    DailyDiary = apps.get_model("main_app", "DailyDiary")
+    DiarySearchToken = apps.get_model("main_app", "DiarySearchToken")
+    indexed = DiarySearchToken.objects.filter(diary=OuterRef("pk"))
+    diaries = DailyDiary.objects.exclude(Exists(indexed)).only("owner", *SEARCHABLE_FIELDS).order_by("pk")
+    for diary in diaries.iterator(chunk_size=500):
+        tokens = text_tokens(*(getattr(diary, name) for name in SEARCHABLE_FIELDS))
+        DiarySearchToken.objects.bulk_create(
+            [DiarySearchToken(diary=diary, owner_id=diary.owner_id, token=token) for token in tokens]
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0028_delivery_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_tokens, migrations.RunPython.noop),
+    ]
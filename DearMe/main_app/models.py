@@ -1,21 +1,26 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models.functions import Lower
 from django.urls import reverse
 from django.contrib.auth.models import AbstractUser
 from django.conf import settings
 from django.utils import timezone
 from datetime import timedelta
 from encrypted_model_fields.fields import EncryptedTextField
+from .fields import CachedEncryptedTextField
 import uuid
 import os
-import brevo_python
-from brevo_python.rest import ApiException
-import base64
-from django.utils.text import slugify
+from django.utils.text import Truncator, slugify
+from .attachments import inline_attachment, should_inline
+from .rendering import render_letter
+from .search import text_tokens
+from .storage import content_storage
 
 
 # ----------------------------
 # Helper functions for file uploads
 # ----------------------------
+# The upload fields use content-addressed storage (main_app.storage), which
+# keeps only the extension of these names
 def profile_pic_path(instance, filename):
     ext = filename.split('.')[-1]
     filename = f"{uuid.uuid4()}.{ext}"
@@ -40,7 +45,7 @@ def diary_file_path(instance, filename):
 class CustomUser(AbstractUser):
     birthday = models.DateField(null=True, blank=True)
     email = models.EmailField(unique=True)
-    profile_picture = models.ImageField(upload_to=profile_pic_path, null=True, blank=True)
+    profile_picture = models.ImageField(upload_to=profile_pic_path, storage=content_storage, null=True, blank=True)
     timezone = models.CharField(max_length=50, default='UTC')
     is_email_verified = models.BooleanField(default=False)
     hide_name = models.BooleanField(default=False)
@@ -58,6 +63,12 @@ class Tag(models.Model):
     name = models.CharField(max_length=50, unique=True)
     slug = models.SlugField(max_length=50, unique=True, blank=True)
 
+    class Meta:
+        constraints = [
+            # Case-insensitive: "Travel" and "travel" are one tag
+            models.UniqueConstraint(Lower("name"), name="tag_name_ci_unique"),
+        ]
+
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name)
@@ -78,6 +89,11 @@ class Location(models.Model):
     longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(Lower("name"), name="location_name_ci_unique"),
+        ]
+
     def __str__(self):
         parts = [self.name]
         if self.city:
@@ -110,18 +126,28 @@ class Memory(models.Model):
     location = models.ForeignKey(Location, on_delete=models.SET_NULL, null=True, blank=True, related_name="memories")
     is_private = models.BooleanField(default=True, help_text="Memory is private by default")
     take_to_grave = models.BooleanField(default=False, help_text="Memory won't be shared after death")
-    photo = models.ImageField(upload_to=memory_file_path, null=True, blank=True)
-    audio = models.FileField(upload_to=memory_file_path, null=True, blank=True)
-    video = models.FileField(upload_to=memory_file_path, null=True, blank=True)
+    photo = models.ImageField(upload_to=memory_file_path, storage=content_storage, null=True, blank=True)
+    audio = models.FileField(upload_to=memory_file_path, storage=content_storage, null=True, blank=True)
+    video = models.FileField(upload_to=memory_file_path, storage=content_storage, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     memory_date = models.DateField(default=timezone.now)
-    
+    # How often the "I'm sad" button has shown this memory
+    times_shown = models.PositiveIntegerField(default=0, editable=False)
 
     def __str__(self):
         return f"{self.title} ({self.get_memory_type_display()})"
 
     class Meta:
         ordering = ['-memory_date', '-created_at']
+        indexes = [
+            # Keyset pagination of a user's memories in list order
+            models.Index(fields=["owner", "-memory_date", "-created_at"], name="memory_owner_list_idx"),
+            # Random sampling by type: COUNT and OFFSET walk this index only
+            models.Index(fields=["owner", "memory_type", "id"], name="memory_owner_type_idx"),
+            # ...and for the weighted modes (sampling.WEIGHTED_ORDERINGS)
+            models.Index(fields=["owner", "memory_type", "memory_date", "id"], name="memory_owner_type_date_idx"),
+            models.Index(fields=["owner", "memory_type", "times_shown", "id"], name="memory_owner_type_shown_idx"),
+        ]
 
 
 # ----------------------------
@@ -130,26 +156,70 @@ class Memory(models.Model):
 class DailyDiary(models.Model):
     owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="diary_entries")
     entry_date = models.DateField()
-    text = EncryptedTextField(blank=True)
+    text = CachedEncryptedTextField(blank=True)
     memories = models.ManyToManyField(Memory, blank=True, related_name="included_in_diaries")
-    audio = models.FileField(upload_to=diary_file_path, null=True, blank=True)
-    photo = models.ImageField(upload_to=diary_file_path, null=True, blank=True)  # single photo
-    favorite_music = EncryptedTextField(blank=True, help_text="Optional: list your favorite music or upload an MP3 file")
-    favorite_foods = EncryptedTextField(blank=True, help_text="Optional: list your favorite foods")
-    favorite_shows = EncryptedTextField(blank=True, help_text="Optional: list your favorite anime/TV shows or add links")
+    audio = models.FileField(upload_to=diary_file_path, storage=content_storage, null=True, blank=True)
+    photo = models.ImageField(upload_to=diary_file_path, storage=content_storage, null=True, blank=True)  # single photo
+    favorite_music = CachedEncryptedTextField(blank=True, help_text="Optional: list your favorite music or upload an MP3 file")
+    favorite_foods = CachedEncryptedTextField(blank=True, help_text="Optional: list your favorite foods")
+    favorite_shows = CachedEncryptedTextField(blank=True, help_text="Optional: list your favorite anime/TV shows or add links")
     take_to_grave = models.BooleanField(default=False, help_text="Diary won't be shared after death")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     locations = models.ManyToManyField(Location, blank=True, related_name="diary_entries")
+    # First PREVIEW_CHARS of text, kept on save so list pages decrypt one short
+    # value per entry instead of every encrypted field
+    preview = CachedEncryptedTextField(blank=True, editable=False)
+
+    PREVIEW_CHARS = 120
+    # Encrypted fields covered by the blind search index (DiarySearchToken)
+    SEARCHABLE_FIELDS = ("text", "favorite_music", "favorite_foods", "favorite_shows")
 
     class Meta:
         unique_together = ("owner", "entry_date")
         ordering = ['-entry_date']
 
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None or "text" in update_fields:
+            self.preview = self.make_preview(self.text)
+            if update_fields is not None:
+                kwargs["update_fields"] = {*update_fields, "preview"}
+        super().save(*args, **kwargs)
+        if update_fields is None or set(update_fields) & set(self.SEARCHABLE_FIELDS):
+            self.reindex_search()
+
+    def reindex_search(self):
+        tokens = text_tokens(*(getattr(self, name) for name in self.SEARCHABLE_FIELDS))
+        with transaction.atomic():
+            self.search_tokens.all().delete()
+            DiarySearchToken.objects.bulk_create(
+                [DiarySearchToken(diary=self, owner_id=self.owner_id, token=token) for token in tokens]
+            )
+
+    @classmethod
+    def make_preview(cls, text):
+        return Truncator(text or "").chars(cls.PREVIEW_CHARS)
+
     def __str__(self):
         return f"Diary entry for {self.entry_date} by {self.owner.username}"
 
 
+class DiarySearchToken(models.Model):
+    # One row per distinct word of a diary entry, stored as a keyed hash (see
+    # main_app.search) so entries can be searched without decrypting them
+    diary = models.ForeignKey(DailyDiary, on_delete=models.CASCADE, related_name="search_tokens")
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+")
+    token = models.CharField(max_length=32)
+
+    class Meta:
+        unique_together = ("diary", "token")
+        indexes = [
+            # Word lookups, per user or (admin) across everyone
+            models.Index(fields=["token", "owner"], name="diary_search_token_idx"),
+        ]
+
+
 
 
 # ----------------------------
@@ -160,19 +230,33 @@ class Letter(models.Model):
         ("draft", "Draft"),
         ("scheduled", "Scheduled"),
         ("locked", "Locked"),
+        ("sending", "Sending"),
         ("delivered", "Delivered"),
+        ("failed", "Failed to send"),
+        ("archived", "Archived"),
     ]
+    # Letters still waiting for their delivery date
+    DELIVERABLE_STATUSES = ("scheduled", "locked")
 
     sender = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="sent_letters")
     receivers = models.ManyToManyField(settings.AUTH_USER_MODEL, related_name="received_letters", blank=True)
     external_emails = models.TextField(blank=True, help_text="Comma-separated emails for people outside the app")
     subject = models.CharField(max_length=255)
     body = models.TextField()
-    attachment = models.FileField(upload_to="letter_attachments/", null=True, blank=True)
+    attachment = models.FileField(upload_to="letter_attachments/", storage=content_storage, null=True, blank=True)
+    # Stored files are named by content hash; this is the name it was uploaded as
+    attachment_name = models.CharField(max_length=255, blank=True, editable=False)
     delivery_date = models.DateTimeField()
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="draft")
     locked_at = models.DateTimeField(null=True, blank=True)
     grace_period_hours = models.IntegerField(default=48)
+    # Delivery lease: which worker is sending this letter and until when
+    claimed_by = models.CharField(max_length=100, blank=True)
+    lease_expires_at = models.DateTimeField(null=True, blank=True)
+    # Ready-to-send email body, frozen when the letter is scheduled or locked.
+    # Encrypted because it contains decrypted diary excerpts.
+    rendered_html = EncryptedTextField(blank=True)
+    rendered_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -180,20 +264,44 @@ class Letter(models.Model):
     memories = models.ManyToManyField(Memory, blank=True, related_name="included_in_letters")
     diary_entries = models.ManyToManyField(DailyDiary, blank=True, related_name="included_in_letters")
 
+    class Meta:
+        indexes = [
+            # Due-letter scan. Only undelivered letters are indexed, so the index
+            # stays small no matter how many letters have already been delivered.
+            models.Index(
+                fields=["delivery_date"],
+                name="letter_due_idx",
+                condition=models.Q(status__in=["scheduled", "locked"]),
+            ),
+            # Admin status filter / date hierarchy, and the due scan on backends
+            # without partial index support.
+            models.Index(fields=["status", "delivery_date"], name="letter_status_delivery_idx"),
+            # Keyset pagination of a user's letters, newest first
+            models.Index(fields=["sender", "-created_at"], name="letter_sender_list_idx"),
+        ]
+
     def is_editable(self):
         if self.status == "draft":
             return True
         if self.status == "scheduled":
-            if not self.locked_at:
-                return True
-            return timezone.now() < self.locked_at + timedelta(hours=self.grace_period_hours)
+            # main_app.lifecycle locks these in bulk once the grace window has
+            # passed; the time check covers the gap between runs.
+            return timezone.now() < self.created_at + timedelta(hours=self.grace_period_hours)
         return False
 
     def lock(self):
         self.status = "locked"
         self.locked_at = timezone.now()
+        self.freeze_payload(commit=False)
         self.save()
 
+    def freeze_payload(self, commit=True):
+        # Call after the memories / diary entries M2M has been saved
+        self.rendered_html = render_letter(self)
+        self.rendered_at = timezone.now()
+        if commit:
+            self.save(update_fields=["rendered_html", "rendered_at"])
+
     def is_due(self):
         return timezone.now() >= self.delivery_date
 
@@ -206,36 +314,156 @@ class Letter(models.Model):
     def __str__(self):
         return f"{self.subject} ({self.get_status_display()})"
 
+    def get_recipients(self):
+        # [(email, user or None)], de-duplicated case-insensitively. Uses the
+        # prefetch cache when the caller loaded receivers in bulk.
+        recipients = {}
+        for r in self.receivers.all():
+            if r.email:
+                recipients.setdefault(r.email.lower(), (r.email, r))
+        for e in self.get_external_emails():
+            recipients.setdefault(e.lower(), (e, None))
+        return list(recipients.values())
+
+    @property
+    def attachment_filename(self):
+        # Stored under its content hash; this is the name it was uploaded as
+        return self.attachment_name or os.path.basename(self.attachment.name)
+
+    def build_attachment(self):
+        # Large files are linked from the email body instead (see outbox)
+        if not self.attachment or not should_inline(self.attachment):
+            return None
+        return inline_attachment(self.attachment)
+
     def send_email_brevo(self):
-        recipients = [{"email": r.email} for r in self.receivers.all() if r.email]
-        recipients += [{"email": e} for e in self.get_external_emails()]
-        if not recipients:
-            return False
+        # Goes through the outbox so a manual send and the scheduled run share
+        # idempotency keys and can never both deliver to the same recipient.
+        from .outbox import enqueue_letters, send_outbound_email
 
-        configuration = brevo_python.Configuration()
-        configuration.api_key['api-key'] = os.getenv('BREVO_API_KEY', settings.BREVO_API_KEY)
-        api_instance = brevo_python.TransactionalEmailsApi(brevo_python.ApiClient(configuration))
-
-        send_smtp_email = brevo_python.SendSmtpEmail(
-            to=recipients,
-            sender={"name": "DearMe App", "email": os.getenv("BREVO_SENDER_EMAIL", settings.BREVO_SENDER_EMAIL)},
-            subject=self.subject,
-            html_content=self.body
-        )
-
-        if self.attachment:
-            with open(self.attachment.path, "rb") as f:
-                send_smtp_email.attachment = [{
-                    "content": base64.b64encode(f.read()).decode(),
-                    "name": os.path.basename(self.attachment.name)
-                }]
-
-        try:
-            response = api_instance.send_transac_email(send_smtp_email)
-            print(response)
-            self.status = "delivered"
-            self.save()
-            return True
-        except ApiException as e:
-            print(f"Brevo error: {e}")
+        emails = enqueue_letters([self]).get(self.pk)
+        if not emails:
             return False
+        return all([send_outbound_email(email) for email in emails])
+
+
+# ----------------------------
+# Outbound Email (outbox)
+# ----------------------------
+class OutboundEmail(models.Model):
+    KIND_CHOICES = [
+        ("letter", "Letter"),
+        ("verification", "Email verification"),
+        ("password_reset", "Password reset"),
+    ]
+    STATUS_CHOICES = [
+        ("pending", "Pending"),
+        ("sent", "Sent"),
+        ("dead", "Dead"),
+    ]
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    idempotency_key = models.CharField(max_length=255, unique=True)
+    letter = models.ForeignKey(Letter, on_delete=models.CASCADE, null=True, blank=True, related_name="outbound_emails")
+    to = models.JSONField(default=list)
+    subject = models.CharField(max_length=255)
+    html_content = EncryptedTextField()  # may carry diary excerpts or reset links
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="pending")
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    provider_message_id = models.CharField(max_length=255, blank=True)
+    claimed_by = models.CharField(max_length=100, blank=True)
+    lease_expires_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "next_attempt_at"], name="outbox_due_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} {self.idempotency_key} ({self.get_status_display()})"
+
+
+# ----------------------------
+# Delivery Attempt (metrics log)
+# ----------------------------
+class DeliveryAttempt(models.Model):
+    # One row per provider call; the source for delivery metrics across all
+    # worker processes. Pruned after METRICS_RETENTION_DAYS.
+    outbound_email = models.ForeignKey(OutboundEmail, on_delete=models.CASCADE, related_name="attempt_log")
+    kind = models.CharField(max_length=20, choices=OutboundEmail.KIND_CHOICES)
+    latency_ms = models.PositiveIntegerField()
+    error_class = models.CharField(max_length=50, blank=True)
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f"{self.outbound_email_id} {self.error_class or 'ok'} ({self.latency_ms} ms)"
+
+
+# ----------------------------
+# Delivery Counter (metrics totals)
+# ----------------------------
+class DeliveryCounter(models.Model):
+    # Running totals for the Prometheus endpoint, e.g.
+    # ("dearme_provider_latency_ms_bucket", 'le="250"'). Only ever increased,
+    # so they survive DeliveryAttempt pruning; see metrics.count_results().
+    name = models.CharField(max_length=100)
+    labels = models.CharField(max_length=100, blank=True)
+    value = models.FloatField(default=0)
+
+    class Meta:
+        unique_together = ("name", "labels")
+
+    def __str__(self):
+        return f"{self.name}{{{self.labels}}} {self.value:g}"
+
+
+# ----------------------------
+# Letter Recipient
+# ----------------------------
+class LetterRecipient(models.Model):
+    STATUS_CHOICES = [
+        ("pending", "Pending"),
+        ("sent", "Sent"),
+        ("failed", "Failed"),
+    ]
+
+    letter = models.ForeignKey(Letter, on_delete=models.CASCADE, related_name="recipients")
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name="+")
+    email = models.EmailField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="pending")
+    outbound_email = models.ForeignKey(OutboundEmail, on_delete=models.SET_NULL, null=True, blank=True, related_name="recipients")
+    provider_message_id = models.CharField(max_length=255, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        unique_together = ("letter", "email")
+
+    def __str__(self):
+        return f"{self.email} ({self.get_status_display()})"
+
+
+# ----------------------------
+# Media Blob (content-addressed storage)
+# ----------------------------
+class MediaBlob(models.Model):
+    # One stored file in main_app.storage and how many file fields point at
+    # it. Unreferenced blobs are pruned after MEDIA_BLOB_GRACE_HOURS.
+    name = models.CharField(max_length=255, unique=True)
+    size = models.BigIntegerField()
+    refcount = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    orphaned_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["orphaned_at"], condition=models.Q(refcount=0), name="mediablob_orphaned_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.refcount} refs)"
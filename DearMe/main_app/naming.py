@@ -0,0 +1,97 @@
+from django.db import transaction
+from django.db.models.functions import Lower
+from django.utils.text import slugify
+
+from .autocomplete import location_index, tag_index
+
+
+# ----------------------------
+# Bulk tag / location resolution
+# ----------------------------
+# Turns typed names into rows in a fixed number of queries: one SELECT for the
+# names that exist, one INSERT ... ON CONFLICT DO NOTHING for the rest, one
+# SELECT for what was inserted. The unique index on lower(name) makes a
+# concurrent insert of the same name a no-op here instead of a duplicate, and
+# the second SELECT then picks up whichever row won.
+#
+# bulk_create sends no post_save, so the rows it creates are added to this
+# process's autocomplete index here (other processes load them at their next
+# AUTOCOMPLETE_REFRESH_SECONDS refresh, as for any new row).
+def _unique_names(names):
+    # Case-insensitive dedupe, first spelling wins, order kept
+    unique = {}
+    for name in names:
+        name = name.strip()
+        if name:
+            unique.setdefault(name.lower(), name)
+    return unique
+
+
+def _existing(model, keys):
+    rows = model.objects.annotate(name_key=Lower("name")).filter(name_key__in=keys)
+    return {row.name.lower(): row for row in rows}
+
+
+def _new_tags(model, names):
+    # bulk_create skips Tag.save(), so slugs are filled in here, suffixed
+    # where two names slugify the same (or to nothing, e.g. non-Latin names)
+    slugs = {name: slugify(name) or "tag" for name in names}
+    taken = set(model.objects.filter(slug__in=slugs.values()).values_list("slug", flat=True))
+    rows = []
+    for name, slug in slugs.items():
+        candidate, n = slug, 1
+        while candidate in taken:
+            n += 1
+            candidate = f"{slug}-{n}"
+        taken.add(candidate)
+        rows.append(model(name=name, slug=candidate))
+    return rows
+
+
+def _add_to_index(index, rows):
+    for row in rows:
+        index.add(row.pk, row.name)
+
+
+def resolve_names(model, names, index=None):
+    unique = _unique_names(names)
+    if not unique:
+        return []
+
+    found = _existing(model, list(unique))
+    missing = [name for key, name in unique.items() if key not in found]
+    if missing:
+        if any(field.name == "slug" for field in model._meta.fields):
+            rows = _new_tags(model, missing)
+        else:
+            rows = [model(name=name) for name in missing]
+        model.objects.bulk_create(rows, ignore_conflicts=True)
+        created = _existing(model, [name.lower() for name in missing])
+        found.update(created)
+        if index is not None:
+            transaction.on_commit(lambda: _add_to_index(index, created.values()))
+
+        # Still missing: the insert lost on another unique column (a slug
+        # taken in the meantime) or the database folds case differently
+        # from Python. Rare; resolve those one at a time.
+        for key, name in unique.items():
+            if key not in found:
+                row = model.objects.filter(name__iexact=name).first()
+                if row is None:
+                    row = model(name=name)
+                    if hasattr(row, "slug"):
+                        row.slug = _new_tags(model, [name])[0].slug
+                    row.save()
+                found[key] = row
+
+    return [found[key] for key in unique]
+
+
+def resolve_tags(names):
+    from .models import Tag
+    return resolve_names(Tag, names, tag_index)
+
+
+def resolve_locations(names):
+    from .models import Location
+    return resolve_names(Location, names, location_index)
@@ -0,0 +1,415 @@
+import logging
+import random
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import brevo_python
+import urllib3
+from brevo_python.rest import ApiException
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Count, Q
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.html import escape
+from kombu.exceptions import OperationalError
+
+from .attachments import should_inline
+from .mail import get_brevo_api, default_sender
+from .metrics import count_results
+from .models import DeliveryAttempt, Letter, LetterRecipient, OutboundEmail
+from .rendering import render_letter
+from .utils import generate_attachment_token
+
+logger = logging.getLogger(__name__)
+
+
+# ----------------------------
+# Enqueueing
+# ----------------------------
+def enqueue_email(kind, idempotency_key, to, subject, html_content, letter=None):
+    # The idempotency key is unique, so enqueueing the same message twice
+    # returns the existing row instead of creating a second delivery.
+    email, _ = OutboundEmail.objects.get_or_create(
+        idempotency_key=idempotency_key,
+        defaults={
+            "kind": kind,
+            "to": to,
+            "subject": subject,
+            "html_content": html_content,
+            "letter": letter,
+        },
+    )
+    return email
+
+
+def letter_idempotency_key(letter):
+    return f"letter:{letter.pk}:{int(letter.delivery_date.timestamp())}"
+
+
+def attachment_link(letter):
+    token = generate_attachment_token(letter.pk)
+    url = settings.SITE_URL.rstrip("/") + reverse("letter_attachment_download", args=[token])
+    name = escape(letter.attachment_filename)
+    return f'<p>Attachment: <a href="{url}">{name}</a></p>'
+
+
+def letter_html(letter):
+    html_content = letter.rendered_html or render_letter(letter)
+    if letter.attachment and not should_inline(letter.attachment):
+        # Too big to inline; recipients get a signed download link instead
+        html_content += attachment_link(letter)
+    return html_content
+
+
+def enqueue_letters(letters):
+    # Fans each letter out into per-recipient rows and batches those into
+    # outbox messages of LETTER_RECIPIENT_BATCH_SIZE. Returns {letter pk: [emails]}.
+    # Query count is per batch of letters, not per letter or recipient.
+    LetterRecipient.objects.bulk_create(
+        [LetterRecipient(letter=letter, email=email, user=user)
+         for letter in letters for email, user in letter.get_recipients()],
+        ignore_conflicts=True,
+    )
+    unassigned = {}
+    for recipient in LetterRecipient.objects.filter(
+        letter__in=letters, status="pending", outbound_email__isnull=True
+    ).order_by("pk"):
+        unassigned.setdefault(recipient.letter_id, []).append(recipient)
+
+    size = settings.LETTER_RECIPIENT_BATCH_SIZE
+    batches = []
+    for letter in letters:
+        recipients = unassigned.get(letter.pk, [])
+        if not recipients:
+            continue
+        try:
+            html_content = letter_html(letter)
+        except Exception as e:
+            # Missing attachment file, broken template, ...: fail this letter
+            # only. No outbox rows, so the caller marks it failed.
+            logger.exception("delivery render_failed letter=%s", letter.pk)
+            LetterRecipient.objects.filter(pk__in=[r.pk for r in recipients]).update(
+                status="failed", last_error=f"{type(e).__name__}: {e}"
+            )
+            continue
+        for start in range(0, len(recipients), size):
+            chunk = recipients[start:start + size]
+            key = f"{letter_idempotency_key(letter)}:{chunk[0].pk}"
+            batches.append((key, chunk, OutboundEmail(
+                kind="letter", idempotency_key=key, letter=letter, subject=letter.subject,
+                html_content=html_content, to=[{"email": r.email} for r in chunk],
+            )))
+
+    if batches:
+        OutboundEmail.objects.bulk_create([email for _, _, email in batches], ignore_conflicts=True)
+        by_key = OutboundEmail.objects.in_bulk([key for key, _, _ in batches], field_name="idempotency_key")
+        assigned = []
+        for key, chunk, _ in batches:
+            for recipient in chunk:
+                recipient.outbound_email = by_key[key]
+                assigned.append(recipient)
+        LetterRecipient.objects.bulk_update(assigned, ["outbound_email"])
+
+    emails = {}
+    for email in OutboundEmail.objects.filter(letter__in=letters).exclude(status="dead").order_by("pk"):
+        emails.setdefault(email.letter_id, []).append(email)
+    return emails
+
+
+# ----------------------------
+# Sending
+# ----------------------------
+def build_message(email):
+    message = brevo_python.SendSmtpEmail(
+        sender=default_sender(),
+        subject=email.subject,
+        html_content=email.html_content,
+        headers={"X-Idempotency-Key": email.idempotency_key},
+    )
+    if email.kind == "letter" and len(email.to) > 1:
+        # One API call, but every recipient gets their own copy and never
+        # sees the other addresses.
+        message.message_versions = [{"to": [to]} for to in email.to]
+    else:
+        message.to = email.to
+    if email.letter_id:
+        message.attachment = email.letter.build_attachment()
+    return message
+
+
+def prepare_message(email):
+    # (message, None), or (None, error) when the message can't be built, e.g.
+    # its letter's attachment file is gone. The error is recorded like a
+    # rejected send, so that message goes dead and the rest carry on.
+    try:
+        return build_message(email), None
+    except Exception as e:
+        logger.exception("delivery build_failed email=%s", email.pk)
+        return None, e
+
+
+def attempt(api_instance, message):
+    # No ORM access here so it can run on a worker thread.
+    # Returns (message ids, error, seconds spent waiting on the provider).
+    started = time.perf_counter()
+    # (connect, read): a lone number would be a total timeout, and only if int
+    timeout = (settings.BREVO_REQUEST_TIMEOUT_SECONDS, settings.BREVO_REQUEST_TIMEOUT_SECONDS)
+    try:
+        response = api_instance.send_transac_email(message, _request_timeout=timeout)
+        message_ids = getattr(response, "message_ids", None) or [getattr(response, "message_id", None) or ""]
+        return message_ids, None, time.perf_counter() - started
+    except (ApiException, urllib3.exceptions.HTTPError) as e:
+        return None, e, time.perf_counter() - started
+
+
+def is_retryable(error):
+    if not isinstance(error, (ApiException, urllib3.exceptions.HTTPError)):
+        return False  # failed before reaching the provider; retrying won't help
+    status = getattr(error, "status", None)
+    # Rejected payloads (bad address, bad key) will not succeed on retry
+    return status is None or status in (408, 429) or status >= 500
+
+
+def retry_after(error):
+    # Honour the provider's Retry-After on 429/503 responses
+    headers = getattr(error, "headers", None) or {}
+    try:
+        return timedelta(seconds=int(headers.get("Retry-After")))
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempts):
+    # Exponential backoff with jitter so a provider outage is not followed by
+    # every queued message retrying in the same second.
+    delay = min(settings.OUTBOX_BACKOFF_MAX_SECONDS, settings.OUTBOX_BACKOFF_BASE_SECONDS * 2 ** (attempts - 1))
+    return timedelta(seconds=random.uniform(delay / 2, delay))
+
+
+def error_class(error):
+    # Coarse label for metrics: http_429, http_503, MaxRetryError, ...
+    status = getattr(error, "status", None)
+    return f"http_{status}" if status else type(error).__name__
+
+
+def _leased(results):
+    # The outbox rows of `results` still under the lease they were sent with
+    # (a dispatch batch shares one lease, so this is usually one condition)
+    leases = defaultdict(list)
+    for email, *_ in results:
+        leases[(email.claimed_by, email.lease_expires_at)].append(email.pk)
+    leased = Q()
+    for (claimed_by, expires), pks in leases.items():
+        leased |= Q(pk__in=pks, claimed_by=claimed_by, lease_expires_at=expires)
+    return OutboundEmail.objects.filter(leased)
+
+
+def record_results(results, now=None):
+    # results: [(email, message_ids, error, latency)]. Bulk updates for the
+    # outbox rows and their recipients, however many messages were in the batch.
+    if not results:
+        return
+    now = now or timezone.now()
+    with transaction.atomic():
+        _record_results(results, now)
+
+
+def _record_results(results, now):
+    outcomes = {}  # outbox pk -> (message ids, error, dead)
+    to_split = []
+    attempts = [
+        DeliveryAttempt(
+            outbound_email=email, kind=email.kind, latency_ms=int(latency * 1000),
+            error_class=error_class(error) if error is not None else "", created_at=now,
+        )
+        for email, message_ids, error, latency in results
+    ]
+
+    # A call that outlived its lease may have been claimed and sent again by
+    # another worker since; its outcome is theirs to record now. Rows stay
+    # locked (Postgres) until this transaction commits.
+    leased = _leased(results)
+    held = set(leased.select_for_update().values_list("pk", flat=True))
+    for email, *_ in results:
+        if email.pk not in held:
+            logger.warning("delivery lease_lost email=%s kind=%s worker=%s", email.pk, email.kind, email.claimed_by)
+    results = [result for result in results if result[0].pk in held]
+
+    for email, message_ids, error, latency in results:
+        if error is None:
+            logger.info("delivery sent email=%s kind=%s latency_ms=%d", email.pk, email.kind, latency * 1000)
+        else:
+            logger.warning("delivery failed email=%s kind=%s attempt=%d error=%s latency_ms=%d",
+                           email.pk, email.kind, email.attempts + 1, error_class(error), latency * 1000)
+
+        email.attempts += 1
+        email.claimed_by = ""
+        email.lease_expires_at = None
+        dead = False
+        if error is None:
+            email.status = "sent"
+            email.sent_at = now
+            email.provider_message_id = message_ids[0] if message_ids else ""
+            email.last_error = ""
+        else:
+            email.last_error = str(error)
+            if not is_retryable(error) or email.attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+                email.status = "dead"
+                dead = True
+                if email.letter_id and len(email.to) > 1 and isinstance(error, ApiException) and not is_retryable(error):
+                    # One bad address rejects the whole batch; retry each
+                    # recipient on its own so only that address fails.
+                    to_split.append(email)
+            else:
+                email.next_attempt_at = now + (retry_after(error) or backoff_delay(email.attempts))
+        outcomes[email.pk] = (message_ids, error, dead)
+
+    # Filtered on the lease again: SQLite ignores select_for_update()
+    leased.bulk_update(
+        [result[0] for result in results],
+        ["attempts", "status", "sent_at", "provider_message_id", "last_error",
+         "next_attempt_at", "claimed_by", "lease_expires_at"],
+    )
+
+    DeliveryAttempt.objects.bulk_create(attempts)
+
+    lags = []
+    letter_ids = {result[0].letter_id for result in results if result[0].letter_id}
+    if letter_ids:
+        delivery_dates = dict(Letter.objects.filter(pk__in=letter_ids).values_list("pk", "delivery_date"))
+        split_ids = {email.pk for email in to_split}
+        recipients = list(LetterRecipient.objects.filter(outbound_email__in=outcomes.keys()).order_by("pk"))
+        ids_by_email = {}
+        for email, message_ids, error, _ in results:
+            if error is None and message_ids and len(message_ids) == len(email.to):
+                ids_by_email[email.pk] = dict(zip([to["email"] for to in email.to], message_ids))
+        for recipient in recipients:
+            message_ids, error, dead = outcomes[recipient.outbound_email_id]
+            if error is None:
+                recipient.status = "sent"
+                recipient.sent_at = now
+                recipient.provider_message_id = ids_by_email.get(recipient.outbound_email_id, {}).get(recipient.email, "")
+                recipient.last_error = ""
+                lags.append((now - delivery_dates[recipient.letter_id]).total_seconds())
+            elif recipient.outbound_email_id in split_ids:
+                recipient.outbound_email = None
+                recipient.last_error = str(error)
+            elif dead:
+                recipient.status = "failed"
+                recipient.last_error = str(error)
+        LetterRecipient.objects.bulk_update(
+            recipients, ["status", "sent_at", "provider_message_id", "last_error", "outbound_email"]
+        )
+        if to_split:
+            enqueue_single_recipients(to_split)
+        finish_letters(letter_ids, now)
+    count_results(attempts, lags)
+
+
+def enqueue_single_recipients(emails):
+    # Re-queue the recipients of rejected batches one address per message
+    created = []
+    for email in emails:
+        for recipient in LetterRecipient.objects.filter(letter_id=email.letter_id, outbound_email__isnull=True, status="pending"):
+            single = enqueue_email(
+                "letter", f"{email.idempotency_key}:{recipient.email.lower()}",
+                [{"email": recipient.email}], email.subject, email.html_content, letter=email.letter,
+            )
+            recipient.outbound_email = single
+            created.append(recipient)
+    LetterRecipient.objects.bulk_update(created, ["outbound_email"])
+
+
+def finish_letters(letter_ids, now):
+    # A letter is done once no recipient is pending: delivered if anyone got
+    # it, failed if every address was rejected.
+    counts = (
+        LetterRecipient.objects.filter(letter__in=letter_ids)
+        .values("letter")
+        .annotate(pending=Count("pk", filter=Q(status="pending")), sent=Count("pk", filter=Q(status="sent")))
+    )
+    delivered = [row["letter"] for row in counts if not row["pending"] and row["sent"]]
+    failed = [row["letter"] for row in counts if not row["pending"] and not row["sent"]]
+    # Not letters already finished, or claimed by a worker enqueueing them
+    # right now: a late result must not overwrite either
+    unfinished = Letter.objects.exclude(status__in=("delivered", "failed", "archived")).filter(lease_free(now))
+    if delivered:
+        unfinished.filter(pk__in=delivered).update(status="delivered", updated_at=now)
+    if failed:
+        unfinished.filter(pk__in=failed).update(status="failed", updated_at=now)
+
+
+def lease_free(now):
+    return Q(lease_expires_at__isnull=True) | Q(lease_expires_at__lte=now)
+
+
+def send_outbound_email(email, worker_id="inline"):
+    # Immediate send of a single message, e.g. straight after enqueueing it.
+    # Takes the same lease the dispatcher uses so the two never overlap.
+    now = timezone.now()
+    expires = now + timedelta(seconds=settings.LETTER_DELIVERY_LEASE_SECONDS)
+    claimed = OutboundEmail.objects.filter(pk=email.pk, status="pending").filter(lease_free(now)).update(
+        claimed_by=worker_id, lease_expires_at=expires
+    )
+    email.claimed_by, email.lease_expires_at = worker_id, expires
+    if not claimed:
+        email.refresh_from_db()
+        # Already sent, or in flight on another worker
+        return email.status != "dead"
+    message, error = prepare_message(email)
+    message_ids, latency = None, 0.0
+    if message is not None:
+        message_ids, error, latency = attempt(get_brevo_api(), message)
+    record_results([(email, message_ids, error, latency)])
+    return error is None
+
+
+# ----------------------------
+# Background dispatch (off the request path)
+# ----------------------------
+_executor_lock = threading.Lock()
+_executor = None
+
+
+def get_dispatch_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=settings.MAIL_DISPATCH_THREADS, thread_name_prefix="mail")
+    return _executor
+
+
+def _send_in_thread(email_id):
+    close_old_connections()
+    try:
+        email = OutboundEmail.objects.select_related("letter").filter(pk=email_id).first()
+        if email is not None:
+            send_outbound_email(email, worker_id="thread")
+    except Exception:
+        # The row is still pending, so the outbox dispatcher will retry it
+        logger.exception("Background send of outbound email %s failed", email_id)
+    finally:
+        connection.close()
+
+
+def _dispatch(email_id):
+    if settings.MAIL_DISPATCH_BACKEND == "celery":
+        from .tasks import send_outbound_email_task
+
+        try:
+            send_outbound_email_task.delay(email_id)
+            return
+        except OperationalError:
+            logger.warning("Celery broker unavailable, sending outbound email %s in-process", email_id)
+    get_dispatch_executor().submit(_send_in_thread, email_id)
+
+
+def dispatch_email(email):
+    # Returns immediately; the first attempt runs on a Celery worker or a pool
+    # thread once the surrounding transaction has committed the row.
+    transaction.on_commit(lambda: _dispatch(email.pk))
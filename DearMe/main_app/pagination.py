@@ -0,0 +1,140 @@
+import json
+from datetime import date
+
+from django.core import signing
+from django.db.models import BooleanField, Expression, F, Q, Value
+
+
+# ----------------------------
+# Keyset (cursor) pagination
+# ----------------------------
+# Instead of OFFSET, each page starts strictly after the last row of the
+# previous one: WHERE (a, b, pk) < (:a, :b, :pk) ORDER BY a, b, pk LIMIT n.
+# The row-value comparison is a single range condition on an index over the
+# ordering, so every page costs the same as the first.
+# The cursor is the last row's sort key, signed so clients can't forge one.
+CURSOR_SALT = "main_app.pagination"
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+class KeysetPage:
+    def __init__(self, items, next_cursor):
+        self.items = items
+        self.next_cursor = next_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def _sort_keys(model, ordering):
+    # [(field, descending)], always ending in pk so the key is unique
+    keys = [(name.lstrip("-"), name.startswith("-")) for name in ordering]
+    if not any(name in ("pk", model._meta.pk.name) for name, _ in keys):
+        keys.append(("pk", keys[-1][1] if keys else False))
+    return keys
+
+
+def encode_cursor(values):
+    return signing.dumps(values, salt=CURSOR_SALT, serializer=_CursorSerializer, compress=True)
+
+
+def decode_cursor(model, keys, cursor):
+    try:
+        values = signing.loads(cursor, salt=CURSOR_SALT, serializer=_CursorSerializer)
+    except signing.BadSignature:
+        raise InvalidCursor(cursor)
+    if not isinstance(values, list) or len(values) != len(keys):
+        raise InvalidCursor(cursor)
+    fields = [model._meta.pk if name == "pk" else model._meta.get_field(name) for name, _ in keys]
+    return [field.to_python(value) for field, value in zip(fields, values)]
+
+
+class RowComparison(Expression):
+    # (a, b, c) > (x, y, z) as the database's own row-value comparison
+    conditional = True
+    output_field = BooleanField()
+
+    def __init__(self, names, values, descending=False):
+        super().__init__()
+        self.columns = [F(name) for name in names]
+        self.values = values
+        self.descending = descending
+
+    def get_source_expressions(self):
+        return self.columns
+
+    def set_source_expressions(self, exprs):
+        self.columns = exprs
+
+    def as_sql(self, compiler, connection):
+        columns, values, params = [], [], []
+        for column in self.columns:
+            sql, column_params = compiler.compile(column)
+            columns.append(sql)
+            params.extend(column_params)
+        for column, value in zip(self.columns, self.values):
+            # Through the field, so dates and aware datetimes are adapted
+            # as they are in a plain filter
+            sql, value_params = compiler.compile(Value(value, output_field=column.output_field))
+            values.append(sql)
+            params.extend(value_params)
+        operator = "<" if self.descending else ">"
+        return f"({', '.join(columns)}) {operator} ({', '.join(values)})", params
+
+
+def _after(keys, values):
+    # Sort keys must not be NULL. Row values compare every column in one
+    # direction, which covers the orderings used here; a mixed ordering is
+    # spelled out instead: a > x OR (a = x AND b < y) OR ...
+    directions = {descending for _, descending in keys}
+    if len(directions) == 1:
+        return RowComparison([name for name, _ in keys], values, directions.pop())
+    condition = Q()
+    equal = Q()
+    for (name, descending), value in zip(keys, values):
+        condition |= equal & Q(**{f"{name}__{'lt' if descending else 'gt'}": value})
+        equal &= Q(**{name: value})
+    return condition
+
+
+def keyset_paginate(queryset, ordering, cursor=None, page_size=20):
+    keys = _sort_keys(queryset.model, ordering)
+    queryset = queryset.order_by(*[f"-{name}" if descending else name for name, descending in keys])
+    if cursor:
+        queryset = queryset.filter(_after(keys, decode_cursor(queryset.model, keys, cursor)))
+
+    # One extra row tells us whether there is a next page without a COUNT
+    items = list(queryset[:page_size + 1])
+    next_cursor = None
+    if len(items) > page_size:
+        items = items[:page_size]
+        last = items[-1]
+        next_cursor = encode_cursor([getattr(last, name) for name, _ in keys])
+    return KeysetPage(items, next_cursor)
+
+
+class _CursorSerializer:
+    # JSON with dates and datetimes as full-precision ISO strings (Django's
+    # encoder drops microseconds, which would skip or repeat rows);
+    # decode_cursor turns them back through each field's to_python().
+    def dumps(self, obj):
+        return json.dumps(obj, separators=(",", ":"), default=self.default).encode("latin-1")
+
+    def loads(self, data):
+        return json.loads(data.decode("latin-1"))
+
+    @staticmethod
+    def default(value):
+        if isinstance(value, date):
+            return value.isoformat()
+        raise TypeError(f"Cannot put {type(value).__name__} in a cursor")
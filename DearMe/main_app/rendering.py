@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.template.loader import render_to_string
+from django.utils.text import Truncator
+
+
+# ----------------------------
+# Letter email payloads
+# ----------------------------
+def render_letter(letter):
+    # All the expensive work for a letter (M2M queries, diary decryption)
+    # happens here, once, instead of when a burst of letters comes due.
+    diary_entries = []
+    for diary in letter.diary_entries.order_by("entry_date"):
+        diary.excerpt = Truncator(diary.text).chars(settings.LETTER_DIARY_EXCERPT_CHARS)
+        diary_entries.append(diary)
+
+    return render_to_string("letters/email.html", {
+        "letter": letter,
+        "memories": letter.memories.order_by("memory_date"),
+        "diary_entries": diary_entries,
+        "site_url": settings.SITE_URL.rstrip("/"),
+    })
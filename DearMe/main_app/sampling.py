@@ -0,0 +1,60 @@
+import random
+
+
+# ----------------------------
+# Random memory sampling
+# ----------------------------
+# Picks one row without loading the candidate set: COUNT the candidates, then
+# fetch the single pk at a random offset of an indexed ordering, then the row.
+# Weighted modes skew the offset toward the front of a different ordering.
+WEIGHTED_ORDERINGS = {
+    "older": ("memory_date", "pk"),
+    "less_viewed": ("times_shown", "pk"),
+}
+
+
+def _pick_offset(count, weighting):
+    if weighting in WEIGHTED_ORDERINGS:
+        # Squaring a uniform draw favours low offsets: the first quarter of
+        # the ordering gets half the picks.
+        return min(int(count * random.random() ** 2), count - 1)
+    return random.randrange(count)
+
+
+# A row deleted between the COUNT and the fetch can leave the offset past the
+# end; the pick is then redone against a fresh count
+ATTEMPTS = 3
+
+
+def sample(queryset, exclude_ids=(), weighting=""):
+    for _ in range(ATTEMPTS):
+        candidates, count = _candidates(queryset, exclude_ids)
+        if not count:
+            return None
+        ordering = WEIGHTED_ORDERINGS.get(weighting, ("pk",))
+        pks = candidates.order_by(*ordering).values_list("pk", flat=True)
+        offset = _pick_offset(count, weighting)
+        memory = queryset.filter(pk__in=list(pks[offset:offset + 1])).first()
+        if memory is not None:
+            return memory
+    return None
+
+
+def _candidates(queryset, exclude_ids):
+    candidates = queryset.exclude(pk__in=exclude_ids) if exclude_ids else queryset
+    count = candidates.count()
+    if not count and exclude_ids:
+        # Everything was shown recently; allow repeats rather than nothing,
+        # but still avoid showing the very last one twice in a row
+        candidates = queryset.exclude(pk=exclude_ids[-1])
+        count = candidates.count()
+        if not count:
+            candidates, count = queryset, queryset.count()
+    return candidates, count
+
+
+def remember(session, key, pk, size):
+    # Ring buffer of the last `size` ids shown, kept in the session
+    recent = [seen for seen in session.get(key, []) if seen != pk]
+    recent.append(pk)
+    session[key] = recent[-size:] if size > 0 else []
@@ -0,0 +1,131 @@
+import heapq
+import logging
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Min
+from django.utils import timezone
+
+from .delivery import deliver_due_letters, due_emails, make_worker_id
+from .lifecycle import run_lifecycle
+from .models import Letter
+
+logger = logging.getLogger(__name__)
+
+
+# ----------------------------
+# Event-driven delivery scheduler
+# ----------------------------
+class DeliveryScheduler:
+    # Keeps a min-heap of upcoming delivery dates and sleeps until the next one
+    # instead of scanning the whole table on a fixed interval. New and edited
+    # letters are found through a high-water mark on Letter.updated_at.
+
+    def __init__(self, poll_interval=None, horizon=None, concurrency=None, batch_size=None, on_report=None):
+        self.poll_interval = poll_interval or settings.DELIVERY_DAEMON_POLL_SECONDS
+        self.horizon = timedelta(seconds=horizon or settings.DELIVERY_DAEMON_HORIZON_SECONDS)
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.on_report = on_report
+        self.worker_id = make_worker_id()
+        self.stopping = threading.Event()
+
+        self.heap = []
+        self.scheduled = {}  # letter pk -> delivery_date currently in the heap
+        self.high_water_mark = None
+        self.horizon_end = None
+        self.next_retry_at = None
+        self.lifecycle_interval = timedelta(seconds=settings.LETTER_LIFECYCLE_INTERVAL_SECONDS)
+
+    def stop(self, *args):
+        self.stopping.set()
+
+    def push(self, pk, delivery_date):
+        if self.scheduled.get(pk) == delivery_date:
+            return
+        self.scheduled[pk] = delivery_date
+        heapq.heappush(self.heap, (delivery_date, pk))
+
+    def load_horizon(self, now):
+        # Only letters due before the horizon are held in memory; the window
+        # slides forward as it is consumed.
+        self.horizon_end = now + self.horizon
+        upcoming = Letter.objects.filter(status__in=Letter.DELIVERABLE_STATUSES, delivery_date__lte=self.horizon_end)
+        for pk, delivery_date in upcoming.values_list("pk", "delivery_date"):
+            self.push(pk, delivery_date)
+
+    def poll_changes(self, now):
+        # Re-read a small overlap so rows committed slightly out of order or
+        # stamped by a server with a skewed clock are not missed.
+        changed = Letter.objects.filter(status__in=Letter.DELIVERABLE_STATUSES, delivery_date__lte=self.horizon_end)
+        if self.high_water_mark:
+            changed = changed.filter(updated_at__gte=self.high_water_mark - timedelta(seconds=self.poll_interval))
+        for pk, delivery_date in changed.values_list("pk", "delivery_date"):
+            self.push(pk, delivery_date)
+        self.high_water_mark = now
+        self.next_retry_at = due_emails(self.horizon_end).aggregate(at=Min("next_attempt_at"))["at"]
+
+    def pop_due(self, now):
+        due = False
+        while self.heap and self.heap[0][0] <= now:
+            delivery_date, pk = heapq.heappop(self.heap)
+            # Stale entries (letter moved to another date) are skipped
+            if self.scheduled.get(pk) == delivery_date:
+                del self.scheduled[pk]
+                due = True
+        return due
+
+    def next_wakeup(self, now, next_poll, next_lifecycle):
+        candidates = [next_poll, self.horizon_end, next_lifecycle]
+        if self.heap:
+            candidates.append(self.heap[0][0])
+        if self.next_retry_at:
+            candidates.append(self.next_retry_at)
+        seconds = (min(candidates) - now).total_seconds()
+        # A retry that is already due but leased by another worker would
+        # otherwise spin the loop; back off briefly instead.
+        return seconds if seconds > 0 else 1
+
+    def run(self):
+        next_poll = next_lifecycle = None
+        # Deliver anything that came due while the daemon was down
+        due = True
+        failures = 0
+
+        while not self.stopping.is_set():
+            try:
+                close_old_connections()
+                now = timezone.now()
+
+                if self.horizon_end is None or now >= self.horizon_end:
+                    self.load_horizon(now)
+                if next_poll is None or now >= next_poll:
+                    self.poll_changes(now)
+                    next_poll = now + timedelta(seconds=self.poll_interval)
+                if next_lifecycle is None or now >= next_lifecycle:
+                    run_lifecycle(now)
+                    next_lifecycle = now + self.lifecycle_interval
+
+                due = self.pop_due(now) or due
+                if due or (self.next_retry_at and self.next_retry_at <= now):
+                    report = deliver_due_letters(
+                        concurrency=self.concurrency, batch_size=self.batch_size, worker_id=self.worker_id
+                    )
+                    self.next_retry_at = due_emails(self.horizon_end).aggregate(at=Min("next_attempt_at"))["at"]
+                    due = False
+                    if self.on_report and report.total:
+                        self.on_report(report)
+                failures = 0
+                wait = self.next_wakeup(timezone.now(), next_poll, next_lifecycle)
+            except Exception:
+                # A bad row or a database outage: keep the daemon alive and
+                # try again later, backing off while the failure persists.
+                # Whatever was due is retried on the next pass.
+                failures += 1
+                wait = min(self.poll_interval * 2 ** (failures - 1), settings.DELIVERY_DAEMON_MAX_BACKOFF_SECONDS)
+                logger.exception("scheduler pass_failed failures=%d retry_in=%ds", failures, wait)
+                due = True
+
+            self.stopping.wait(wait)
@@ -0,0 +1,75 @@
+import hashlib
+import hmac
+import re
+import unicodedata
+
+from django.conf import settings
+from django.db.models import Count
+from django.utils.html import strip_tags
+
+
+# ----------------------------
+# Blind index for encrypted diary text
+# ----------------------------
+# Each distinct word of an entry is stored as HMAC(key, word), never as
+# plaintext. Searching hashes the query words the same way and looks them up
+# through an ordinary index. Without the key the tokens can't be reversed,
+# though equal words in different entries share a token.
+WORD_RE = re.compile(r"\w+")
+MIN_WORD_LENGTH = 2
+TOKEN_BYTES = 16
+
+
+def _index_key():
+    key = settings.DIARY_SEARCH_KEY
+    if not key:
+        # Derived from the field encryption key so there is nothing extra to
+        # configure; set DIARY_SEARCH_KEY to keep the index across key rotations.
+        encryption_key = settings.FIELD_ENCRYPTION_KEY
+        if isinstance(encryption_key, (list, tuple)):
+            encryption_key = encryption_key[0]
+        key = hmac.new(encryption_key.encode(), b"diary-search-index", hashlib.sha256).hexdigest()
+    return key.encode()
+
+
+def normalize_words(text):
+    # Case- and accent-insensitive: "Café" and "cafe" index the same
+    text = unicodedata.normalize("NFKD", strip_tags(text or "")).casefold()
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return {word for word in WORD_RE.findall(text) if len(word) >= MIN_WORD_LENGTH}
+
+
+def word_token(word, key=None):
+    return hmac.new(key or _index_key(), word.encode(), hashlib.sha256).hexdigest()[:TOKEN_BYTES * 2]
+
+
+def text_tokens(*texts):
+    key = _index_key()
+    words = set()
+    for text in texts:
+        words |= normalize_words(text)
+    return {word_token(word, key) for word in words}
+
+
+def query_tokens(query):
+    key = _index_key()
+    return {word_token(word, key) for word in normalize_words(query)}
+
+
+def matching_diaries(queryset, query, owner=None):
+    # Entries containing every word of the query
+    from .models import DiarySearchToken
+
+    tokens = query_tokens(query)
+    if not tokens:
+        return queryset.none()
+    matches = DiarySearchToken.objects.filter(token__in=tokens)
+    if owner is not None:
+        matches = matches.filter(owner=owner)
+    matches = (
+        matches.values("diary")
+        .annotate(found=Count("token"))
+        .filter(found=len(tokens))
+        .values("diary")
+    )
+    return queryset.filter(pk__in=matches)
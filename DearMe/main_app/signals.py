@@ -0,0 +1,166 @@
+import os
+
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .autocomplete import location_index, tag_index
+from .memory_search import index_memory, remove_memory
+from .models import CustomUser, DailyDiary, Letter, Location, Memory, Tag
+from .storage import acquire, release
+from .thumbnails import schedule_variants, variants_ready
+
+
+# ----------------------------
+# Keep the memory search index in sync
+# ----------------------------
+class _Reindex:
+    # The pending reindex of one transaction: ids collect here until commit
+    def __init__(self):
+        self.memory_ids = set()
+
+    def __call__(self):
+        memories = Memory.objects.filter(pk__in=self.memory_ids)
+        for memory in memories.select_related("location").prefetch_related("tags"):
+            index_memory(memory)
+
+
+def reindex(memory_ids):
+    # After commit, once per memory: a form save followed by tags.set() fires
+    # several signals for the same memory, so they share the callback already
+    # queued for this transaction. A rollback drops that callback, and the
+    # next signal queues a fresh one.
+    connection = transaction.get_connection()
+    pending = getattr(connection, "memory_reindex", None)
+    if pending is None or not any(entry[1] is pending for entry in connection.run_on_commit):
+        pending = connection.memory_reindex = _Reindex()
+        pending.memory_ids.update(memory_ids)
+        transaction.on_commit(pending)
+    else:
+        pending.memory_ids.update(memory_ids)
+
+
+@receiver(post_save, sender=Memory)
+def memory_saved(sender, instance, **kwargs):
+    reindex([instance.pk])
+
+
+@receiver(post_delete, sender=Memory)
+def memory_deleted(sender, instance, **kwargs):
+    remove_memory(instance.pk)
+
+
+@receiver(m2m_changed, sender=Memory.tags.through)
+def memory_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if not reverse:
+        reindex([instance.pk])
+    elif pk_set:
+        reindex(list(pk_set))  # tag.memories.add(...)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Location)
+def name_changed(sender, instance, created, **kwargs):
+    if not created:
+        reindex(list(instance.memories.values_list("pk", flat=True)))
+
+
+@receiver(pre_delete, sender=Tag)
+@receiver(pre_delete, sender=Location)
+def name_deleted(sender, instance, **kwargs):
+    # The tag links / location references are gone by post_delete, so collect
+    # the affected memories now; reindex() runs after commit either way.
+    reindex(list(instance.memories.values_list("pk", flat=True)))
+
+
+# ----------------------------
+# Keep the autocomplete indexes in sync (this process; others refresh)
+# ----------------------------
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Location)
+def autocomplete_saved(sender, instance, **kwargs):
+    index = tag_index if sender is Tag else location_index
+    transaction.on_commit(lambda: index.add(instance.pk, instance.name))
+
+
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Location)
+def autocomplete_deleted(sender, instance, **kwargs):
+    index = tag_index if sender is Tag else location_index
+    pk = instance.pk
+    transaction.on_commit(lambda: index.remove(pk))
+
+
+# ----------------------------
+# Resize uploaded photos in the background
+# ----------------------------
+IMAGE_FIELDS = {Memory: "photo", DailyDiary: "photo", CustomUser: "profile_picture"}
+
+
+@receiver(post_save, sender=Memory)
+@receiver(post_save, sender=DailyDiary)
+@receiver(post_save, sender=CustomUser)
+def image_saved(sender, instance, **kwargs):
+    name = getattr(instance, IMAGE_FIELDS[sender]).name
+    if name and not variants_ready(name):
+        transaction.on_commit(lambda: schedule_variants(name))
+
+
+# ----------------------------
+# Reference counts for content-addressed uploads
+# ----------------------------
+BLOB_FIELDS = {
+    Memory: ("photo", "audio", "video"),
+    DailyDiary: ("photo", "audio"),
+    Letter: ("attachment",),
+    CustomUser: ("profile_picture",),
+}
+
+
+def _blob_fields(sender, update_fields):
+    fields = BLOB_FIELDS[sender]
+    if update_fields is not None:
+        fields = tuple(field for field in fields if field in update_fields)
+    return fields
+
+
+@receiver(pre_save, sender=Memory)
+@receiver(pre_save, sender=DailyDiary)
+@receiver(pre_save, sender=Letter)
+@receiver(pre_save, sender=CustomUser)
+def blobs_before_save(sender, instance, update_fields=None, **kwargs):
+    fields = _blob_fields(sender, update_fields)
+    instance._blobs_before = {}
+    if fields and not instance._state.adding:
+        instance._blobs_before = sender.objects.filter(pk=instance.pk).values(*fields).first() or {}
+    if sender is Letter and instance.attachment and not instance.attachment._committed:
+        # Still the uploaded name; storage renames it to the content hash
+        instance.attachment_name = os.path.basename(instance.attachment.name)
+
+
+@receiver(post_save, sender=Memory)
+@receiver(post_save, sender=DailyDiary)
+@receiver(post_save, sender=Letter)
+@receiver(post_save, sender=CustomUser)
+def blobs_after_save(sender, instance, update_fields=None, **kwargs):
+    before = getattr(instance, "_blobs_before", {})
+    for field in _blob_fields(sender, update_fields):
+        old, new = before.get(field) or "", getattr(instance, field).name or ""
+        if old != new:
+            if new:
+                acquire(new)
+            if old:
+                release(old)
+
+
+@receiver(post_delete, sender=Memory)
+@receiver(post_delete, sender=DailyDiary)
+@receiver(post_delete, sender=Letter)
+@receiver(post_delete, sender=CustomUser)
+def blobs_deleted(sender, instance, **kwargs):
+    for field in BLOB_FIELDS[sender]:
+        name = getattr(instance, field).name
+        if name:
+            release(name)
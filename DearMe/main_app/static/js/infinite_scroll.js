@@ -0,0 +1,26 @@
+// Infinite scroll for list pages: when a .load-more sentinel comes into view,
+// fetch the next batch of cards (a server-rendered fragment) and put it in the
+// sentinel's place. The fragment ends with its own sentinel if there is more.
+document.addEventListener("DOMContentLoaded", () => {
+  if (!("IntersectionObserver" in window)) return;
+
+  const observer = new IntersectionObserver(entries => {
+    entries.forEach(async entry => {
+      if (!entry.isIntersecting) return;
+      const sentinel = entry.target;
+      observer.unobserve(sentinel);
+
+      const response = await fetch(sentinel.dataset.next, { headers: { Accept: "text/html" } });
+      if (!response.ok) {
+        observer.observe(sentinel);
+        return;
+      }
+      const template = document.createElement("template");
+      template.innerHTML = await response.text();
+      template.content.querySelectorAll(".load-more").forEach(next => observer.observe(next));
+      sentinel.replaceWith(template.content);
+    });
+  }, { rootMargin: "400px" });
+
+  document.querySelectorAll(".load-more").forEach(sentinel => observer.observe(sentinel));
+});
@@ -0,0 +1,90 @@
+// Turns each <select multiple class="search-picker"> into a search box.
+// The select keeps only the chosen options (that is what gets submitted);
+// matches are fetched page by page from the select's data-search-url.
+document.addEventListener("DOMContentLoaded", () => {
+  document.querySelectorAll("select.search-picker").forEach(select => {
+    const url = select.dataset.searchUrl;
+    const wrapper = document.createElement("div");
+    const chosen = document.createElement("div");
+    const input = document.createElement("input");
+    const results = document.createElement("div");
+    const more = document.createElement("button");
+
+    wrapper.className = "search-picker-wrapper";
+    chosen.className = "search-picker-chosen";
+    input.type = "search";
+    input.placeholder = "Type to search...";
+    results.className = "suggestions-box";
+    more.type = "button";
+    more.textContent = "More results";
+    more.hidden = true;
+
+    select.hidden = true;
+    select.after(wrapper);
+    wrapper.append(chosen, input, results, more);
+
+    function addChip(option) {
+      const chip = document.createElement("span");
+      chip.className = "search-picker-chip";
+      chip.textContent = option.textContent + " ";
+      const remove = document.createElement("button");
+      remove.type = "button";
+      remove.textContent = "×";
+      remove.addEventListener("click", () => {
+        option.remove();
+        chip.remove();
+      });
+      chip.appendChild(remove);
+      chosen.appendChild(chip);
+    }
+
+    function choose(item) {
+      if (select.querySelector(`option[value="${item.id}"]`)) return;
+      const option = new Option(item.label, item.id, true, true);
+      select.appendChild(option);
+      addChip(option);
+    }
+
+    Array.from(select.options).forEach(option => {
+      option.selected = true;
+      addChip(option);
+    });
+
+    let page = 1;
+    let timer = null;
+    let latest = 0;
+
+    async function search(append) {
+      const request = ++latest;
+      const params = new URLSearchParams({ q: input.value, page });
+      const response = await fetch(`${url}?${params}`, { headers: { Accept: "application/json" } });
+      if (!response.ok || request !== latest) return;
+      const data = await response.json();
+      if (!append) results.replaceChildren();
+      data.results.forEach(item => {
+        const row = document.createElement("div");
+        row.className = "suggestion-item";
+        row.textContent = item.label;
+        row.addEventListener("click", () => choose(item));
+        results.appendChild(row);
+      });
+      more.hidden = !data.next_page;
+      if (data.next_page) page = data.next_page;
+    }
+
+    input.addEventListener("input", () => {
+      clearTimeout(timer);
+      timer = setTimeout(() => {
+        page = 1;
+        search(false);
+      }, 200);
+    });
+    input.addEventListener("focus", () => {
+      if (!results.childElementCount) {
+        page = 1;
+        search(false);
+      }
+    });
+    more.addEventListener("click", () => search(true));
+  });
+});
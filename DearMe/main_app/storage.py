@@ -0,0 +1,157 @@
+import hashlib
+import os
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+# ----------------------------
+# Content-addressed media storage
+# ----------------------------
+# Uploads are stored under the SHA-256 of their bytes, hashed while the file
+# is written: blobs/ab/cd/abcd...<ext>. The same photo attached to a memory,
+# a diary entry and re-uploaded on edit is one file. The upload_to name only
+# contributes its extension.
+#
+# Each stored name has a MediaBlob row counting the model fields that point
+# at it (kept by signals, see BLOB_FIELDS there). A blob whose count drops to
+# zero is marked orphaned and removed by prune_media_blobs once it has stayed
+# unreferenced for MEDIA_BLOB_GRACE_HOURS, so an upload that is being saved
+# right now can never lose its file.
+BLOB_DIR = "blobs"
+TMP_DIR = os.path.join(BLOB_DIR, "tmp")
+
+
+def blob_name(digest, extension):
+    return os.path.join(BLOB_DIR, digest[:2], digest[2:4], f"{digest}{extension}")
+
+
+class ContentAddressedStorage(FileSystemStorage):
+
+    def get_available_name(self, name, max_length=None):
+        # The final name is only known once the content is hashed in _save
+        return name
+
+    def _save(self, name, content):
+        extension = os.path.splitext(name)[1].lower()
+        os.makedirs(self.path(TMP_DIR), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.path(TMP_DIR))
+        sha256 = hashlib.sha256()
+        size = 0
+        try:
+            with os.fdopen(fd, "wb") as out:
+                for chunk in content.chunks():
+                    sha256.update(chunk)
+                    out.write(chunk)
+                    size += len(chunk)
+            name = blob_name(sha256.hexdigest(), extension)
+            # Registered before looking for the file: a prune that deleted
+            # it has committed by now, so a missing file is written again
+            register_blob(name, size)
+            path = self.path(name)
+            if os.path.exists(path):
+                os.unlink(tmp)  # already stored
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                if self.file_permissions_mode is not None:
+                    os.chmod(tmp, self.file_permissions_mode)
+                # Atomic, and two writers of the same bytes write the same file
+                os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+        return name
+
+    def save_derived(self, name, content):
+        # Files derived from a blob (resized variants) keep the exact name
+        # they are given, next to the blob. Written to a temp file and moved
+        # into place, so readers never see a partial file.
+        os.makedirs(self.path(TMP_DIR), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.path(TMP_DIR))
+        try:
+            with os.fdopen(fd, "wb") as out:
+                for chunk in content.chunks():
+                    out.write(chunk)
+            path = self.path(name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if self.file_permissions_mode is not None:
+                os.chmod(tmp, self.file_permissions_mode)
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+        return name
+
+
+_storage = None
+
+
+def content_storage():
+    # Callable for FileField(storage=...), so migrations don't serialize it
+    global _storage
+    if _storage is None:
+        _storage = ContentAddressedStorage()
+    return _storage
+
+
+# ----------------------------
+# Reference counting
+# ----------------------------
+def register_blob(name, size):
+    # Born orphaned: if the row that was going to use it is never saved, the
+    # blob is pruned like any other unreferenced one. An existing orphan gets
+    # a fresh orphaned_at, restarting its grace period before the upload's
+    # acquire() arrives. The UPDATE comes first because it waits on a prune
+    # holding the row; a plain read would see the row that prune is deleting.
+    from .models import MediaBlob
+    now = timezone.now()
+    if not MediaBlob.objects.filter(name=name, refcount=0).update(orphaned_at=now):
+        MediaBlob.objects.get_or_create(name=name, defaults={"size": size, "orphaned_at": now})
+
+
+def acquire(name):
+    from .models import MediaBlob
+    MediaBlob.objects.filter(name=name).update(refcount=F("refcount") + 1, orphaned_at=None)
+
+
+def release(name):
+    from .models import MediaBlob
+    blobs = MediaBlob.objects.filter(name=name)
+    blobs.filter(refcount__gt=0).update(refcount=F("refcount") - 1)
+    blobs.filter(refcount=0, orphaned_at__isnull=True).update(orphaned_at=timezone.now())
+
+
+def prune_blobs(now=None, dry_run=False):
+    # Deletes blobs unreferenced for MEDIA_BLOB_GRACE_HOURS, plus their
+    # resized variants and base64 attachment copies. Returns (blobs removed,
+    # bytes freed).
+    from .attachments import discard_encoded
+    from .models import MediaBlob
+    from .thumbnails import variant_names
+
+    cutoff = (now or timezone.now()) - timedelta(hours=settings.MEDIA_BLOB_GRACE_HOURS)
+    storage = content_storage()
+    removed = freed = 0
+    for blob in MediaBlob.objects.filter(refcount=0, orphaned_at__lt=cutoff).iterator():
+        if dry_run:
+            removed, freed = removed + 1, freed + blob.size
+            continue
+        # Conditional, so a blob acquired or re-registered since the query
+        # survives. The files go while the deleted row is still locked, so a
+        # concurrent register_blob() waits and then writes the file again.
+        with transaction.atomic():
+            if not MediaBlob.objects.filter(pk=blob.pk, refcount=0, orphaned_at__lt=cutoff).delete()[0]:
+                continue
+            storage.delete(blob.name)
+            for _, webp, fallback in variant_names(blob.name):
+                storage.delete(webp)
+                storage.delete(fallback)
+            discard_encoded(os.path.splitext(os.path.basename(blob.name))[0])
+        removed, freed = removed + 1, freed + blob.size
+    return removed, freed
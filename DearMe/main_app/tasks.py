@@ -0,0 +1,11 @@
+from celery import shared_task
+
+from .models import OutboundEmail
+from .outbox import send_outbound_email
+
+
+@shared_task(ignore_result=True)
+def send_outbound_email_task(email_id):
+    email = OutboundEmail.objects.select_related("letter").filter(pk=email_id).first()
+    if email is not None:
+        send_outbound_email(email, worker_id="celery")
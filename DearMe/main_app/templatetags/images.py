@@ -0,0 +1,47 @@
+from django import template
+from django.urls import reverse
+from django.utils.html import format_html
+
+from ..thumbnails import variant_names, variants_ready
+
+register = template.Library()
+
+
+@register.simple_tag
+def responsive_image(image, alt="", sizes="100vw", css_class="", loading="lazy"):
+    # <picture> with WebP and fallback srcsets for an uploaded ImageField.
+    # Variants are made after upload (see signals); until they exist, the
+    # srcset points at the image_variant view, which makes them on demand.
+    if not image:
+        return ""
+    name = image.name
+    variants = variant_names(name)
+
+    if variants_ready(name, image.storage):
+        def url(width, variant):
+            return image.storage.url(variant)
+    else:
+        def url(width, variant):
+            kind = "webp" if variant.endswith(".webp") else "fallback"
+            return reverse("image_variant", args=[width, kind, name])
+
+    webp = ", ".join(f"{url(width, webp)} {width}w" for width, webp, _ in variants)
+    fallback = ", ".join(f"{url(width, fallback)} {width}w" for width, _, fallback in variants)
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" alt="{}" class="{}" loading="{}"></picture>',
+        webp, sizes, image.url, fallback, sizes, alt, css_class, loading,
+    )
+
+
+@register.filter
+def thumbnail_url(image, width):
+    # URL of the smallest fallback (JPEG/PNG) variant at least `width` wide,
+    # for places without srcset or WebP support such as email. The original
+    # until the variants exist.
+    if not image:
+        return ""
+    variants = variant_names(image.name)
+    wide_enough = [fallback for w, _, fallback in variants if w >= int(width)]
+    fallback = wide_enough[0] if wide_enough else variants[-1][2]
+    return image.storage.url(fallback) if image.storage.exists(fallback) else image.url
@@ -0,0 +1,132 @@
+import logging
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+from .storage import content_storage
+
+logger = logging.getLogger(__name__)
+
+# ----------------------------
+# Responsive image variants
+# ----------------------------
+# Each uploaded photo gets downscaled copies next to the original, one per
+# IMAGE_VARIANT_WIDTHS entry, in WebP and in a fallback format:
+#   memories_files/<uuid>.jpg -> memories_files/<uuid>.w320.webp, <uuid>.w320.jpg, ...
+# Names are derived from the original name alone, so templates can build a
+# srcset without opening the image. Images are never upscaled: a variant of
+# a photo narrower than its width is just a re-encoded copy.
+
+# Upload directories whose images get variants (content-addressed blobs, and
+# the upload_to directories of files stored before that)
+VARIANT_DIRECTORIES = ("blobs/", "memories_files/", "diary_files/", "profile_pics/")
+# Originals keeping transparency get a PNG fallback, everything else JPEG
+FALLBACK_EXTENSIONS = {".png": ".png"}
+FORMATS = {".webp": "WEBP", ".jpg": "JPEG", ".png": "PNG"}
+
+
+def fallback_extension(name):
+    return FALLBACK_EXTENSIONS.get(os.path.splitext(name)[1].lower(), ".jpg")
+
+
+def variant_name(name, width, extension):
+    return f"{os.path.splitext(name)[0]}.w{width}{extension}"
+
+
+def variant_names(name):
+    # (width, webp name, fallback name), smallest first
+    fallback = fallback_extension(name)
+    return [
+        (width, variant_name(name, width, ".webp"), variant_name(name, width, fallback))
+        for width in sorted(settings.IMAGE_VARIANT_WIDTHS)
+    ]
+
+
+def variants_ready(name, storage=None):
+    # The smallest WebP is written last, so it marks a finished set
+    return (storage or content_storage()).exists(variant_names(name)[0][1])
+
+
+def _encode(image, extension):
+    buffer = BytesIO()
+    if extension == ".jpg" and image.mode != "RGB":
+        image = image.convert("RGB")
+    image.save(buffer, FORMATS[extension], quality=settings.IMAGE_VARIANT_QUALITY, optimize=True)
+    return buffer.getvalue()
+
+
+def generate_variants(name, storage=None):
+    # Idempotent: variants that already exist are left alone. Originals and
+    # variants go through the same storage as the upload fields (files from
+    # before content addressing live under the same root).
+    storage = storage or content_storage()
+    names = variant_names(name)
+    if storage.exists(names[0][1]):
+        return 0
+    with storage.open(name, "rb") as f:
+        original = ImageOps.exif_transpose(Image.open(f))
+        original.load()
+    if original.mode not in ("RGB", "RGBA"):
+        original = original.convert("RGBA" if "A" in original.getbands() or "transparency" in original.info else "RGB")
+
+    written = 0
+    # Largest first: each step downsizes the previous result, which is
+    # much cheaper than resampling the full-size original every time
+    image = original
+    for width, webp_name, fallback_name in reversed(names):
+        if image.width > width:
+            image = image.copy()
+            image.thumbnail((width, image.height), Image.LANCZOS)
+        for target in (fallback_name, webp_name):
+            if not storage.exists(target):
+                storage.save_derived(target, ContentFile(_encode(image, os.path.splitext(target)[1])))
+                written += 1
+    return written
+
+
+def _init_worker():
+    import django
+    django.setup()
+
+
+def _generate_in_worker(name):
+    try:
+        return generate_variants(name)
+    except Exception:
+        logger.exception("event=image_variants_failed name=%s", name)
+        return 0
+
+
+_pool = None
+_pool_lock = threading.Lock()
+_pending = set()  # names queued in this process, so repeat renders don't re-queue
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ProcessPoolExecutor(max_workers=settings.IMAGE_VARIANT_WORKERS, initializer=_init_worker)
+    return _pool
+
+
+def schedule_variants(name):
+    # Resizing is CPU bound, so it runs in worker processes rather than the
+    # request thread. IMAGE_VARIANT_WORKERS = 0 generates inline instead.
+    if not name:
+        return
+    if settings.IMAGE_VARIANT_WORKERS <= 0:
+        _generate_in_worker(name)
+        return
+    with _pool_lock:
+        if name in _pending:
+            return
+        _pending.add(name)
+    future = _get_pool().submit(_generate_in_worker, name)
+    future.add_done_callback(lambda _: _pending.discard(name))
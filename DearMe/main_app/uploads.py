@@ -0,0 +1,83 @@
+import os
+import warnings
+from io import BytesIO
+
+from django import forms
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+
+# ----------------------------
+# Upload-time image normalization
+# ----------------------------
+# Photos straight off a phone are 12-48MP with EXIF attached. Before anything
+# decodes pixels, the header's dimensions are checked against
+# IMAGE_MAX_PIXELS (a decompression bomb is rejected here, cheaply). The
+# image is then downsampled to IMAGE_MAX_EDGE with EXIF orientation applied,
+# and re-encoded without metadata (no GPS, no camera serial), which is what
+# gets stored.
+def check_dimensions(file):
+    # Reads only the header: Image.open() doesn't decode pixel data
+    file.seek(0)
+    try:
+        with warnings.catch_warnings():
+            # Reported below as a validation error instead
+            warnings.simplefilter("ignore", Image.DecompressionBombWarning)
+            with Image.open(file) as image:
+                width, height = image.size
+    except Image.DecompressionBombError:
+        raise forms.ValidationError("This image is too large.", code="image_too_large")
+    except (UnidentifiedImageError, OSError):
+        raise forms.ValidationError("Upload a valid image.", code="invalid_image")
+    finally:
+        file.seek(0)
+    if width * height > settings.IMAGE_MAX_PIXELS:
+        raise forms.ValidationError(
+            "This image is too large (%(megapixels)d megapixels, at most %(limit)d allowed).",
+            code="image_too_large",
+            params={"megapixels": width * height // 1_000_000, "limit": settings.IMAGE_MAX_PIXELS // 1_000_000},
+        )
+
+
+def normalize_image(file):
+    file.seek(0)
+    image = Image.open(file)
+    if getattr(image, "is_animated", False):
+        # Re-encoding would keep only the first frame; store as uploaded
+        file.seek(0)
+        return file
+
+    max_edge = settings.IMAGE_MAX_EDGE
+    # JPEG can decode straight at 1/2, 1/4 or 1/8 scale, so a 48MP photo
+    # never has to be expanded to full size in memory
+    image.draft("RGB", (max_edge, max_edge))
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+
+    has_alpha = image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+    buffer = BytesIO()
+    if has_alpha:
+        image.convert("RGBA").save(buffer, "PNG", optimize=True)
+        extension, content_type = ".png", "image/png"
+    else:
+        image.convert("RGB").save(buffer, "JPEG", quality=settings.IMAGE_UPLOAD_QUALITY, optimize=True, progressive=True)
+        extension, content_type = ".jpg", "image/jpeg"
+
+    stem = os.path.splitext(os.path.basename(file.name or "image"))[0]
+    return SimpleUploadedFile(f"{stem}{extension}", buffer.getvalue(), content_type)
+
+
+class NormalizedImageField(forms.ImageField):
+    # forms.ImageField that rejects oversized images from their header, then
+    # hands back the normalized re-encode instead of the original upload
+
+    def to_python(self, data):
+        if data in self.empty_values:
+            return None
+        check_dimensions(data)
+        data = super().to_python(data)
+        try:
+            return normalize_image(data)
+        except (OSError, ValueError):
+            raise forms.ValidationError(self.error_messages["invalid_image"], code="invalid_image")
@@ -19,16 +19,24 @@ urlpatterns = [
     path('profile/edit/', views.profile, name='edit_profile'),
     path('profile/delete/', views.delete_profile, name='delete_profile'),
     path('dashboard/', views.dashboard, name='dashboard'),
+    path('metrics/', views.delivery_metrics, name='delivery_metrics'),
     path("letters/", views.letter_list, name="letter_list"),
     path("letters/<int:pk>/", views.letter_detail, name="letter_detail"),
     path("letters/new/", views.letter_create, name="letter_create"),
     path("letters/<int:pk>/edit/", views.letter_edit, name="letter_edit"),
     path("letters/<int:pk>/send/", views.send_letter, name="letter_send"),
+    path("letters/search/receivers/", views.search_receivers, name="search_receivers"),
+    path("letters/search/memories/", views.search_memories, name="search_memories"),
+    path("letters/search/diaries/", views.search_diaries, name="search_diaries"),
+    path("letters/attachment/<str:token>/", views.letter_attachment_download, name="letter_attachment_download"),
     path("memories/", views.memory_list, name="memory_list"),
     path("memories/new/", views.memory_create, name="memory_create"),
     path("memories/<int:pk>/", views.memory_detail, name="memory_detail"),
     path("memories/<int:pk>/edit/", views.memory_edit, name="memory_edit"),
     path("memories/<int:pk>/delete/", views.memory_delete, name="memory_delete"),
+    path("memories/autocomplete/tags/", views.autocomplete, {"kind": "tag"}, name="autocomplete_tags"),
+    path("memories/autocomplete/locations/", views.autocomplete, {"kind": "location"}, name="autocomplete_locations"),
+    path("images/<int:width>/<str:kind>/<path:name>", views.image_variant, name="image_variant"),
     path("memories/random/happy/", views.random_happy_memory, name="random_happy_memory"),
     path("memories/type/<str:memory_type>/", views.memory_by_type, name="memory_by_type"),
     path("memories/location/<int:location_id>/", views.memory_by_location, name="memory_by_location"),
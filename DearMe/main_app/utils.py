@@ -10,4 +10,16 @@ def verify_email_token(token, max_age=60*60*24):
         user_id = signer.unsign(token,max_age=max_age)
         return int(user_id)
     except(SignatureExpired, BadSignature):
-        return None
\ No newline at end of file
+        return None
+
+
+attachment_signer = TimestampSigner(salt="letter-attachment")
+
+def generate_attachment_token(letter_id):
+    return attachment_signer.sign(letter_id)
+
+def verify_attachment_token(token, max_age=60*60*24*30):
+    try:
+        return int(attachment_signer.unsign(token, max_age=max_age))
+    except (SignatureExpired, BadSignature):
+        return None
@@ -6,26 +6,35 @@ from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
 from django.contrib.auth.views import LoginView
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.http import HttpResponse
+from django.http import HttpResponse, FileResponse, Http404, JsonResponse
 from django.utils import timezone
 from .models import Letter, CustomUser, Memory, DailyDiary
 from .forms import LetterForm, CustomUserCreationForm, EmailOrUsernameAuthenticationForm, ProfileForm, MemoryForm, DailyDiaryForm
 from django.contrib import messages
-import brevo_python
-from brevo_python.rest import ApiException
 import os
 from django.core.mail import send_mail
 from django.conf import settings
 from django.urls import reverse
 from .utils import generate_email_token
+from .outbox import enqueue_email, dispatch_email
+from .metrics import render_prometheus
+from .pagination import InvalidCursor, KeysetPage, keyset_paginate
+from .memory_search import rank_memories
+from .search import matching_diaries
+from .sampling import remember, sample
+from .autocomplete import suggest
+from .storage import content_storage
+from .thumbnails import VARIANT_DIRECTORIES, fallback_extension, generate_variants, variant_name
 from django.contrib.auth.tokens import default_token_generator
 from django.utils.http import urlsafe_base64_encode
 from django.utils.encoding import force_bytes
+from django.utils.crypto import constant_time_compare
+from django.utils.cache import patch_cache_control
+from PIL import UnidentifiedImageError
 from django.contrib.auth import get_user_model
 from datetime import timedelta, date
 from django.contrib.auth import logout
-from django.db.models import Q
-import random
+from django.db.models import F, Q
 
 
 
@@ -59,28 +68,14 @@ def signup(request):
             This link will expire in 24 hours.
             """
 
-            configuration = brevo_python.Configuration()
-            configuration.api_key['api-key'] = settings.BREVO_API_KEY
-            api_instance = brevo_python.TransactionalEmailsApi(brevo_python.ApiClient(configuration))
-
-            send_smtp_email = brevo_python.SendSmtpEmail(
-                to=[{"email": user.email}],
-                sender={"name": "DearMe App", "email": settings.BREVO_SENDER_EMAIL},
-                subject=subject,
-                html_content=message
+            email = enqueue_email("verification", f"verification:{user.pk}:{token}", [{"email": user.email}], subject, message)
+            dispatch_email(email)
+            messages.success(
+                request,
+                "We've sent you an email with a verification link. "
+                "Please check your inbox and spam/junk folder."
             )
 
-            try:
-                api_instance.send_transac_email(send_smtp_email)
-                messages.success(
-                    request,
-                    "We've sent you an email with a verification link. "
-                    "Please check your inbox and spam/junk folder."
-                )
-            except ApiException as e:
-                messages.error(request, "Could not send verification email. Try again later.")
-                print(f"Brevo error: {e}")
-
             return render(request, 'check_email.html', {'email': user.email})
         else:
             # Form invalid: either username/password issues or email already exists
@@ -137,10 +132,27 @@ def dashboard(request):
     return render(request, "dashboard.html", {"features": features})
 
 
+# List pages: keyset pagination, with ?fragment=1 returning just the next
+# batch of cards for infinite scroll
+def render_list_page(request, queryset, ordering, template, context_name, extra_context=None):
+    try:
+        page = keyset_paginate(queryset, ordering, request.GET.get("cursor"), settings.LIST_PAGE_SIZE)
+    except InvalidCursor:
+        return HttpResponse("Invalid page cursor.", status=400)
+    # Filters etc. carried over to the next-page links
+    params = request.GET.copy()
+    params.pop("cursor", None)
+    params.pop("fragment", None)
+    context = {context_name: page, "page": page, "list_query": params.urlencode(), **(extra_context or {})}
+    if request.GET.get("fragment"):
+        template = template.replace(".html", "_items.html")
+    return render(request, template, context)
+
+
 @login_required
 def letter_list(request):
-    letters = Letter.objects.filter(sender=request.user).order_by("-created_at")
-    return render(request, "letters/letter_list.html", {"letters": letters})
+    letters = Letter.objects.filter(sender=request.user)
+    return render_list_page(request, letters, ["-created_at"], "letters/letter_list.html", "letters")
 
 @login_required
 def letter_detail(request, pk):
@@ -150,19 +162,18 @@ def letter_detail(request, pk):
 @login_required
 def letter_create(request):
     if request.method == "POST":
-        form = LetterForm(request.POST, request.FILES)
-        form.user = request.user  # <<< add this line
+        form = LetterForm(request.POST, request.FILES, user=request.user)
         if form.is_valid():
             letter = form.save(commit=False)
             letter.sender = request.user  # ensure sender is set
             letter.status = "scheduled"
             letter.save()
             form.save_m2m()
+            letter.freeze_payload()
             messages.success(request, "Letter scheduled successfully!")
             return redirect("letter_list")
     else:
-        form = LetterForm()
-        form.user = request.user  # <<< add this line
+        form = LetterForm(user=request.user)
     return render(request, "letters/letter_form.html", {"form": form})
 
 
@@ -175,19 +186,18 @@ def letter_edit(request, pk):
         return render(request, "letters/locked.html", {"letter": letter})
 
     if request.method == "POST":
-        form = LetterForm(request.POST, request.FILES, instance=letter)
-        form.user = request.user
+        form = LetterForm(request.POST, request.FILES, instance=letter, user=request.user)
         if form.is_valid():
             letter = form.save(commit=False)
             letter.status = "scheduled"
             letter.save()
             form.save_m2m()
-
+            letter.freeze_payload()
 
             messages.success(request, "Letter updated and rescheduled!")
             return redirect("letter_detail", pk=letter.pk)
     else:
-        form = LetterForm(instance=letter)
+        form = LetterForm(instance=letter, user=request.user)
     return render(request, "letters/letter_form.html", {"form": form})
 
 
@@ -203,6 +213,87 @@ def send_letter(request, pk):
     return redirect("letter_detail", pk=letter.pk)
 
 
+# Letter form pickers: prefix search, one page at a time
+PICKER_PAGE_SIZE = 20
+
+
+def picker_page(request, queryset, label):
+    try:
+        page = max(int(request.GET.get("page", 1)), 1)
+    except ValueError:
+        page = 1
+    start = (page - 1) * PICKER_PAGE_SIZE
+    # One extra row tells us whether there is a next page without a COUNT
+    rows = list(queryset[start:start + PICKER_PAGE_SIZE + 1])
+    return JsonResponse({
+        "results": [{"id": obj.pk, "label": label(obj)} for obj in rows[:PICKER_PAGE_SIZE]],
+        "next_page": page + 1 if len(rows) > PICKER_PAGE_SIZE else None,
+    })
+
+
+@login_required
+def search_receivers(request):
+    q = request.GET.get("q", "").strip()
+    if not q:
+        return JsonResponse({"results": [], "next_page": None})
+    users = CustomUser.objects.filter(is_active=True).filter(
+        Q(username__istartswith=q) | Q(hide_name=False) & (Q(first_name__istartswith=q) | Q(last_name__istartswith=q))
+    ).only("username", "first_name", "last_name", "hide_name").order_by("username")
+    return picker_page(request, users, lambda user: f"{user.username} ({user.full_name()})" if user.full_name() else user.username)
+
+
+@login_required
+def search_memories(request):
+    q = request.GET.get("q", "").strip()
+    memories = Memory.objects.filter(owner=request.user, title__istartswith=q).only("title", "memory_type")
+    return picker_page(request, memories, str)
+
+
+@login_required
+def search_diaries(request):
+    # By date prefix (2024, 2024-05, 2024-05-17), otherwise by words through
+    # the search index since the text itself is encrypted
+    q = request.GET.get("q", "").strip()
+    diaries = DailyDiary.objects.filter(owner=request.user).only("entry_date")
+    parts = q.split("-") if q else []
+    # (lookup, lowest, highest) for year, month and day; anything out of range
+    # (a half-typed "0", "99999") is searched for as text instead
+    ranges = (("entry_date__year", 1, 9999), ("entry_date__month", 1, 12), ("entry_date__day", 1, 31))
+    if len(parts) <= 3 and all(
+        part.isdigit() and low <= int(part) <= high for part, (_, low, high) in zip(parts, ranges)
+    ):
+        for part, (lookup, _, _) in zip(parts, ranges):
+            diaries = diaries.filter(**{lookup: int(part)})
+    else:
+        diaries = matching_diaries(diaries, q, owner=request.user)
+    return picker_page(request, diaries, lambda diary: f"Diary entry for {diary.entry_date}")
+
+
+def letter_attachment_download(request, token):
+    # Signed link sent in place of attachments too large to inline
+    from .utils import verify_attachment_token
+
+    letter_id = verify_attachment_token(token)
+    if letter_id is None:
+        return HttpResponse("Invalid or expired download link.", status=404)
+    letter = get_object_or_404(Letter, pk=letter_id)
+    if not letter.attachment:
+        raise Http404
+    return FileResponse(letter.attachment.open("rb"), as_attachment=True,
+                        filename=letter.attachment_filename)
+
+
+def delivery_metrics(request):
+    # Prometheus scrape endpoint: staff session or "Authorization: Bearer <METRICS_TOKEN>"
+    token = settings.METRICS_TOKEN
+    authorized = request.user.is_staff or (
+        token and constant_time_compare(request.headers.get("Authorization", ""), f"Bearer {token}")
+    )
+    if not authorized:
+        return HttpResponse(status=403)
+    return HttpResponse(render_prometheus(), content_type="text/plain; version=0.0.4")
+
+
 User = get_user_model()
 
 def forgot_password(request):
@@ -225,22 +316,10 @@ def forgot_password(request):
             This link will expire in 24 hours.
             """
 
-            configuration = brevo_python.Configuration()
-            configuration.api_key['api-key'] = settings.BREVO_API_KEY
-            api_instance = brevo_python.TransactionalEmailsApi(brevo_python.ApiClient(configuration))
-            send_smtp_email = brevo_python.SendSmtpEmail(
-                to=[{"email": user.email}],
-                sender={"name": "DearMe App", "email": settings.BREVO_SENDER_EMAIL},
-                subject=subject,
-                html_content=message
-            )
-            try:
-                api_instance.send_transac_email(send_smtp_email)
-                messages.success(request, "Check your email for the password reset link.")
-                message_sent = True
-            except ApiException as e:
-                messages.error(request, "Could not send email. Try again later.")
-                print(f"Brevo error: {e}")
+            email = enqueue_email("password_reset", f"password_reset:{user.pk}:{token}", [{"email": user.email}], subject, message)
+            dispatch_email(email)
+            messages.success(request, "Check your email for the password reset link.")
+            message_sent = True
 
         except User.DoesNotExist:
             messages.error(request, "No user exists with this email or it is typed incorrectly.")
@@ -296,7 +375,14 @@ def delete_profile(request):
 @login_required
 def memory_list(request):
     memories = Memory.objects.filter(owner=request.user)
-    return render(request, "memories/memory_list.html", {"memories": memories})
+    q = request.GET.get("q", "").strip()
+    if q:
+        # Ranked full-text matches; the best SEARCH_RESULTS_LIMIT, no paging
+        ranked = rank_memories(q, owner_id=request.user.pk, limit=settings.SEARCH_RESULTS_LIMIT)
+        found = memories.in_bulk(ranked)
+        results = KeysetPage([found[pk] for pk in ranked if pk in found], None)
+        return render(request, "memories/memory_list.html", {"memories": results, "page": results, "q": q})
+    return render_list_page(request, memories, Memory._meta.ordering, "memories/memory_list.html", "memories")
 
 
 @login_required
@@ -345,12 +431,42 @@ def memory_delete(request, pk):
     return render(request, "memories/memory_confirm_delete.html", {"memory": memory})
 
 
+# Tag / location suggestions for the memory form
+@login_required
+def autocomplete(request, kind):
+    response = JsonResponse({"results": suggest(kind, request.user, request.GET.get("q", "").strip())})
+    # Keystrokes repeat the same prefixes; let the browser reuse answers briefly
+    patch_cache_control(response, private=True, max_age=60)
+    return response
+
+
+# Photo variant that wasn't generated yet: make it now, then hand off to storage
+@login_required
+def image_variant(request, width, kind, name):
+    name = os.path.normpath(name)
+    if (
+        width not in settings.IMAGE_VARIANT_WIDTHS
+        or not name.startswith(VARIANT_DIRECTORIES)
+        or not content_storage().exists(name)
+    ):
+        raise Http404
+    try:
+        generate_variants(name)
+    except (UnidentifiedImageError, OSError):
+        raise Http404  # not an image (audio, attachment) or unreadable
+    extension = ".webp" if kind == "webp" else fallback_extension(name)
+    return redirect(content_storage().url(variant_name(name, width, extension)))
+
+
 # Random happy memory (for "I'm sad" button)
 @login_required
 def random_happy_memory(request):
     memories = Memory.objects.filter(owner=request.user, memory_type="happy")
-    if memories:
-        memory = random.choice(memories)
+    recent = request.session.get("recent_happy_memories", [])
+    memory = sample(memories, recent, settings.HAPPY_MEMORY_WEIGHTING)
+    if memory:
+        remember(request.session, "recent_happy_memories", memory.pk, settings.HAPPY_MEMORY_NO_REPEAT)
+        Memory.objects.filter(pk=memory.pk).update(times_shown=F("times_shown") + 1)
         # Pass view_only=True so template knows to hide edit/delete
         return render(request, "memories/memory_detail.html", {"memory": memory, "view_only": True})
     messages.info(request, "No happy memories found. Create one first!")
@@ -362,21 +478,24 @@ def random_happy_memory(request):
 @login_required
 def memory_by_type(request, memory_type):
     memories = Memory.objects.filter(owner=request.user, memory_type=memory_type)
-    return render(request, "memories/memory_list.html", {"memories": memories, "filter": memory_type})
+    return render_list_page(request, memories, Memory._meta.ordering, "memories/memory_list.html", "memories",
+                            {"filter": memory_type})
 
 
 # Filter by location
 @login_required
 def memory_by_location(request, location_id):
     memories = Memory.objects.filter(owner=request.user, location_id=location_id)
-    return render(request, "memories/memory_list.html", {"memories": memories, "filter": "location"})
+    return render_list_page(request, memories, Memory._meta.ordering, "memories/memory_list.html", "memories",
+                            {"filter": "location"})
 
 
 # Filter by date
 @login_required
 def memory_by_date(request, date_str):
     memories = Memory.objects.filter(owner=request.user, memory_date=date_str)
-    return render(request, "memories/memory_list.html", {"memories": memories, "filter": date_str})
+    return render_list_page(request, memories, Memory._meta.ordering, "memories/memory_list.html", "memories",
+                            {"filter": date_str})
 
 # -------------------
 # Daily Diary Views
@@ -384,8 +503,12 @@ def memory_by_date(request, date_str):
 
 @login_required
 def diary_list(request):
-    diaries = DailyDiary.objects.filter(owner=request.user)
-    return render(request, "diary/diary_list.html", {"diaries": diaries})
+    # Only the preview is decrypted; text and the favorite_* fields stay deferred
+    diaries = DailyDiary.objects.filter(owner=request.user).only("entry_date", "preview")
+    q = request.GET.get("q", "").strip()
+    if q:
+        diaries = matching_diaries(diaries, q, owner=request.user)
+    return render_list_page(request, diaries, DailyDiary._meta.ordering, "diary/diary_list.html", "diaries", {"q": q})
 
 
 @login_required
@@ -412,10 +535,7 @@ def diary_edit(request, pk):
     if request.method == "POST":
         form = DailyDiaryForm(request.POST, request.FILES, instance=diary, user=request.user)
         if form.is_valid():
-            diary = form.save(commit=False)
-            # Update photo if a new one is uploaded
-            if request.FILES.get("photo"):
-                diary.photo = request.FILES.get("photo")
+            diary = form.save(commit=False)  # a new photo comes through the form, normalized
             diary.save()
             messages.success(request, "Diary entry updated successfully!")
             return redirect("diary_detail", pk=pk)